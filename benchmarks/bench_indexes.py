@@ -0,0 +1,93 @@
+# Seeds a SQLite database, then prints query plans and timings for the hot
+# feed/search/save queries before and after `flask create-indexes`.
+#
+#   python -m benchmarks.bench_indexes --posts 1000000
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_indexes.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from recipe_share import create_app, db
+from recipe_share.feeds import public_feed, user_feed, saved_feed
+from recipe_share.models import User, Post, SavePost
+
+
+def seed(users, posts, saves):
+    random.seed(1)
+    start = datetime(2020, 1, 1)
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+        for i in range(1, users + 1)
+    ])
+    for first in range(1, posts + 1, 10000):
+        db.session.execute(db.insert(Post), [
+            {'id': i, 'title': f'Recipe {i}', 'content': 'c', 'ingredients': 'i',
+             'private': random.random() < 0.2, 'display': random.random() < 0.95,
+             'user_id': random.randint(1, users), 'date_posted': start + timedelta(minutes=i)}
+            for i in range(first, min(first + 10000, posts + 1))
+        ])
+    pairs = {(random.randint(1, users), random.randint(1, posts)) for _ in range(saves)}
+    db.session.execute(db.insert(SavePost), [{'user_id': u, 'post_id': p} for u, p in pairs])
+    db.session.commit()
+
+
+def hot_queries():
+    return {
+        'home page 1': public_feed().limit(5),
+        'home page 2000': public_feed().limit(5).offset(10000),
+        'home count': public_feed().order_by(None).with_entities(db.func.count()),
+        'user feed': user_feed(7).limit(5),
+        'saved feed': saved_feed(7).limit(5),
+        'saved ids': db.select(SavePost.post_id).where(SavePost.user_id == 7),
+        'save toggle lookup': db.select(SavePost).where(SavePost.user_id == 7, SavePost.post_id == 4242),
+        'title search': db.select(Post).where(db.func.lower(Post.title) == db.func.lower('Recipe 4242')),
+    }
+
+
+def report(label):
+    print(f'--- {label}')
+    for name, query in hot_queries().items():
+        statement = getattr(query, 'statement', query)
+        compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        with db.engine.connect() as conn:
+            plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}').fetchall()
+            start = time.perf_counter()
+            for _ in range(5):
+                conn.exec_driver_sql(str(compiled)).fetchall()
+            elapsed = (time.perf_counter() - start) / 5 * 1000
+        print(f'{name:20} {elapsed:9.2f} ms  ' + ' | '.join(row[-1] for row in plan))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--saves', type=int, default=200000)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(db.engine)
+        seed(args.users, args.posts, args.saves)
+        report('without indexes')
+    result = app.test_cli_runner().invoke(args=['create-indexes'])
+    if result.exception:
+        raise result.exception
+    with app.app_context():
+        db.session.execute(db.text('ANALYZE'))
+        report('with indexes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Compares the old nested-loop ingredient search (score every stored recipe)
+# with the index, which scores and ranks from its postings and reads only the
+# rows it returns, and checks both rank the top recipes the same way.
+#
+#   python -m benchmarks.bench_ingredient_index --recipes 100000
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from recipe_share import create_app, db
+from recipe_share.models import ScrapedRecipe
+from recipe_share.posts import corpus
+from recipe_share.posts.ingredient_index import ingredient_index
+from benchmarks.seed import make_recipe
+
+QUERIES = [['chicken'], ['garlic', 'onion'], ['olive oil', 'lemon', 'basil'], ['tomato'], ['chick'],
+           ['potato', 'thyme'], ['saffron'], ['400g'], ['1 tbsp']]
+
+
+def seed(recipes):
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    batch = []
+    for i in range(1, recipes + 1):
+        title, ingredients, method = make_recipe(rng)
+        batch.append({'id': i, 'url': f'/recipes/{i}', 'title': f'{title} {i}', 'ingredients': json.dumps(ingredients),
+                      'method': json.dumps(method), 'fetched_at': now, 'revision': 1})
+        if len(batch) == 10000:
+            db.session.execute(db.insert(ScrapedRecipe), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(ScrapedRecipe), batch)
+    db.session.commit()
+
+
+def full_scan(terms):
+    # The search before the index: read, score and sort every stored recipe.
+    found = []
+    rows = db.session.execute(db.select(ScrapedRecipe.title, ScrapedRecipe.ingredients, ScrapedRecipe.method))
+    for title, ingredients, method in rows:
+        score = corpus.score_recipe(json.loads(ingredients), terms)
+        if score:
+            method_overlap = len(set(terms) & set(' '.join(json.loads(method)).lower().split()))
+            found.append((score, method_overlap, title))
+    found.sort(reverse=True)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=100000)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(args.recipes)
+        start = time.perf_counter()
+        ingredient_index.recipes(['warm'], 1)
+        print(f'recipes={args.recipes} index build {time.perf_counter() - start:.2f}s')
+        limit = app.config['INGREDIENT_SEARCH_LIMIT']
+        for terms in QUERIES:
+            key = corpus.search_terms_key(terms)
+            start = time.perf_counter()
+            expected = full_scan(key)
+            old_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            ranked = ingredient_index.recipes(key, limit)
+            rank_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            results = corpus._search_corpus(key)
+            new_ms = (time.perf_counter() - start) * 1000
+            assert [(score, title) for title, _, _, score in results] == \
+                [(score, title) for score, _, title in expected[:limit]], terms
+            print(f'{" + ".join(terms):28} matches {len(expected):6}  top {len(ranked):4}  '
+                  f'rank {rank_ms:6.1f} ms  search {new_ms:7.1f} ms  full scan {old_ms:7.1f} ms')
+
+if __name__ == '__main__':
+    main()
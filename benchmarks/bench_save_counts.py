@@ -0,0 +1,89 @@
+# Seeds millions of saved posts, then compares ranking posts by saves with a
+# GROUP BY over save_post against reading the save_count index, and times
+# the cached "most saved" list, saving and unsaving through the ORM (which
+# keeps save_count in step), and a full repair-save-counts pass.
+#
+#   python -m benchmarks.bench_save_counts --posts 200000 --saves 2000000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_saves.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('BCRYPT_WORKERS', '0')
+os.environ.setdefault('MAIL_OUTBOX_WORKER', 'none')
+
+from recipe_share import create_app, db
+from recipe_share import feeds
+from recipe_share.commands import repair_save_counts
+from recipe_share.models import Post, SavePost
+from benchmarks.seed import seed
+
+
+def timed(label, fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f'{label:44} {best * 1000:10.2f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--saves', type=int, default=1000000)
+    parser.add_argument('--top', type=int, default=100)
+    parser.add_argument('--toggles', type=int, default=2000)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    app = create_app()
+    app.config['MOST_SAVED_SIZE'] = args.top
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(args.users, args.posts, args.saves, batch_size=20000)
+        print(f'seeded {args.posts} posts and {args.saves} saves in {time.perf_counter() - start:.0f} s')
+
+        group_by = (db.select(SavePost.post_id, db.func.count().label('saves'))
+                    .join(Post, Post.id == SavePost.post_id)
+                    .where(Post.display == True, Post.private == False)
+                    .group_by(SavePost.post_id).order_by(db.text('saves DESC'), SavePost.post_id.desc())
+                    .limit(args.top))
+        by_group = timed(f'top {args.top} by GROUP BY save_post', lambda: db.session.execute(group_by).all(), 3)
+        by_index = (db.select(Post.id, Post.save_count)
+                    .where(Post.save_count > 0, Post.display == True, Post.private == False)
+                    .order_by(Post.save_count.desc(), Post.id.desc()).limit(args.top))
+        by_count = timed(f'top {args.top} by save_count index', lambda: db.session.execute(by_index).all())
+        assert [tuple(row) for row in by_group] == [tuple(row) for row in by_count]
+        feeds.most_saved_ids()
+        timed('cached most_saved_ids()', feeds.most_saved_ids)
+
+        rng = random.Random(1)
+        posts = db.session.scalars(db.select(Post.id).where(Post.private == False).limit(1000)).all()
+        start = time.perf_counter()
+        for i in range(args.toggles):
+            user_id, post_id = rng.randint(1, args.users), rng.choice(posts)
+            save = db.session.scalar(db.select(SavePost).filter_by(user_id=user_id, post_id=post_id))
+            if save is None:
+                db.session.add(SavePost(user_id=user_id, post_id=post_id))
+            else:
+                db.session.delete(save)
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+        print(f'{"save/unsave through the ORM":44} {args.toggles / elapsed:10.1f} /s')
+
+        fixed = timed('repair-save-counts (full recount)', repair_save_counts, 1)
+        print(f'repair fixed {fixed} counts (expected 0)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Pages parsed per second by the scraper's recipe and collection parsers,
+# with the whole page built into a tree (as before) and with only the
+# sections the parsers read, then the strained parser spread over a process
+# pool. Fixture pages are padded with the navigation, scripts and related
+# recipe cards a real page carries around the parts we keep.
+#
+#   python -m benchmarks.bench_scraper_parse --pages 300 --workers 2
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+from recipe_share.posts import scraper
+from benchmarks.fixtures import recipe_page, collection_page
+
+
+def padded(page, i):
+    nav = ''.join(f'<li class="nav__item"><a href="/recipes/collection/{n}">Collection {n}</a></li>'
+                  for n in range(150))
+    script = '<script>window.__data = {' + ','.join(f'"k{n}": "{"x" * 40}"' for n in range(400)) + '};</script>'
+    related = ''.join(
+        f'<article class="card"><div class="card__section"><a href="/recipes/related-{i}-{n}">'
+        f'<img src="/img/{n}.jpg" alt="Related {n}"></a><h2>Related recipe {n}</h2>'
+        f'<p class="card__description">{"A short description of the dish. " * 4}</p></div></article>'
+        for n in range(40))
+    head = f'<html><head>{script}</head><body><header><nav><ul>{nav}</ul></nav></header><main>'
+    return page.replace('<html><body>', head).replace('</body>', f'<aside>{related}</aside></main></body>')
+
+
+def parse_recipe_full(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.find('h1').text.strip()
+    section = soup.find('div', class_='row recipe__instructions')
+    return title, [li.get_text() for li in section.find_all('li')]
+
+
+def timed(label, parse, pages, size):
+    start = time.perf_counter()
+    for page in pages:
+        parse(page)
+    elapsed = time.perf_counter() - start
+    print(f'{label:42} {len(pages) / elapsed:9.1f} pages/s  ({size / 1024:.0f} KB/page)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    recipes = [padded(recipe_page(f'bench-{i}'), i) for i in range(args.pages)]
+    collections = [padded(collection_page(f'bench{i}', 40), i) for i in range(max(1, args.pages // 10))]
+    assert scraper.parse_recipe(recipes[0])[0] == parse_recipe_full(recipes[0])[0]
+    size = sum(map(len, recipes)) / len(recipes)
+    print(f'parser: {scraper.HTML_PARSER}')
+
+    timed('recipe, whole page (html.parser)', parse_recipe_full, recipes, size)
+    timed(f'recipe, sections only ({scraper.HTML_PARSER})', scraper.parse_recipe, recipes, size)
+    timed(f'collection, sections only ({scraper.HTML_PARSER})', scraper.parse_collection, collections,
+          sum(map(len, collections)) / len(collections))
+    if args.workers:
+        with ProcessPoolExecutor(args.workers) as pool:
+            # Start the workers before timing.
+            list(pool.map(scraper.parse_recipe, recipes[:args.workers]))
+            start = time.perf_counter()
+            list(pool.map(scraper.parse_recipe, recipes, chunksize=8))
+            elapsed = time.perf_counter() - start
+        print(f'{f"recipe, sections only, {args.workers} processes":42} {len(recipes) / elapsed:9.1f} pages/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Concurrent feed readers against one writer on a file-backed SQLite
+# database, once with the old rollback journal settings and once with the
+# defaults from Config (WAL, synchronous=NORMAL, mmap). Reports reads and
+# writes per second and reader latency for each.
+#
+#   python -m benchmarks.bench_sqlite_readers --readers 8 --seconds 10
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_readers.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('BCRYPT_WORKERS', '0')
+os.environ.setdefault('MAIL_OUTBOX_WORKER', 'none')
+
+from datetime import datetime
+from recipe_share import create_app, db
+from recipe_share.config import Config
+from recipe_share.feeds import public_feed
+from recipe_share.models import Post
+from benchmarks.seed import seed, make_recipe
+from benchmarks.harness import percentile
+
+PROFILES = {
+    'rollback': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': 0},
+    'wal': {},
+}
+
+
+def reader(app, stop, pages, latencies, errors):
+    rng = random.Random()
+    with app.app_context():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                public_feed().paginate(page=rng.randint(1, pages), per_page=5)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors.append(1)
+            db.session.remove()
+
+
+def writer(app, stop, user_id, interval, writes, errors):
+    rng = random.Random(0)
+    with app.app_context():
+        while not stop.is_set():
+            title, ingredients, method = make_recipe(rng)
+            db.session.add(Post(title=title, content=' '.join(method), ingredients='\n'.join(ingredients),
+                                user_id=user_id, date_posted=datetime.utcnow()))
+            try:
+                db.session.commit()
+                writes.append(1)
+            except Exception:
+                db.session.rollback()
+                errors.append(1)
+            time.sleep(interval)
+        db.session.remove()
+
+
+def run(name, template, args):
+    shutil.copy(template, DB_PATH)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+    config = type(f'{name.title()}Config', (Config,), dict(PROFILES[name], DB_POOL_SIZE=args.readers + 1))
+    app = create_app(config)
+    stop = threading.Event()
+    latencies, writes, errors = [], [], []
+    threads = [threading.Thread(target=reader, args=(app, stop, args.posts // 5, latencies, errors))
+               for _ in range(args.readers)]
+    threads.append(threading.Thread(target=writer, args=(app, stop, 1, args.write_interval, writes, errors)))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        db.engine.dispose()
+    print(f'{name:10} {len(latencies) / args.seconds:10.1f} {len(writes) / args.seconds:9.1f} '
+          f'{percentile(latencies, 50):9.2f} {percentile(latencies, 99):9.2f} {len(errors):7}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-interval', type=float, default=0.01, help='Seconds between writer commits.')
+    args = parser.parse_args()
+
+    template = DB_PATH + '.template'
+    if os.path.exists(template):
+        os.remove(template)
+    config = type('TemplateConfig', (Config,), {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + template,
+                                                'SQLITE_JOURNAL_MODE': 'DELETE'})
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        seed(50, args.posts, 0)
+        db.engine.dispose()
+
+    print(f'{args.readers} readers, one writer committing every {args.write_interval * 1000:.0f} ms')
+    print(f'{"profile":10} {"reads/s":>10} {"writes/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"errors":>7}')
+    for name in PROFILES:
+        run(name, template, args)
+    os.remove(template)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Time to first request for a fresh worker process. Each run starts a new
+# interpreter that imports the app, calls create_app and requests a few
+# pages through the test client; the times are wall clock from launching
+# the process. Runs with an empty template cache, with a cache filled by
+# `flask compile-templates`, and with WARM_UP_ON_START. --before REV runs
+# the same against a checkout of an older revision for comparison.
+#
+#   python -m benchmarks.bench_startup --posts 20000 --before HEAD~1
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_startup.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('BCRYPT_WORKERS', '0')
+os.environ.setdefault('MAIL_OUTBOX_WORKER', 'none')
+
+PAGES = ['/', '/most_saved', '/search?q=chicken', '/search_predictions?query=spi']
+
+# Runs in the child. Prints wall clock timestamps for the parent to subtract
+# its launch time from.
+CHILD = '''
+import json, sys, time
+marks = {}
+from recipe_share import create_app
+marks['imported'] = time.time()
+app = create_app()
+marks['created'] = time.time()
+client = app.test_client()
+for path in json.loads(sys.argv[1]):
+    response = client.get(path)
+    assert response.status_code == 200, (path, response.status_code)
+    marks[path] = time.time()
+marks['scraper_imported'] = any(name in sys.modules for name in ('aiohttp', 'bs4'))
+print(json.dumps(marks))
+'''
+
+
+def run_child(tree, env):
+    start = time.time()
+    output = subprocess.run([sys.executable, '-c', CHILD, json.dumps(PAGES)], cwd=tree, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    marks = json.loads(output.splitlines()[-1])
+    scraper = marks.pop('scraper_imported')
+    return {name: (at - start) * 1000 for name, at in marks.items()}, scraper
+
+
+def measure(label, tree, env, runs, empty_cache=False):
+    samples = []
+    for _ in range(runs):
+        if empty_cache:
+            shutil.rmtree(env['TEMPLATE_CACHE_DIR'], ignore_errors=True)
+        timings, scraper = run_child(tree, env)
+        samples.append(timings)
+    median = {name: statistics.median(sample[name] for sample in samples) for name in samples[0]}
+    first = median[PAGES[0]] - median['created']
+    print(f'{label:34} {median["imported"]:8.0f} {median["created"]:8.0f} {first:8.1f} '
+          f'{median[PAGES[0]]:8.0f} {median[PAGES[-1]]:8.0f}   {"yes" if scraper else "no"}')
+
+
+def run_tree(name, tree, runs):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [tree, os.environ.get('PYTHONPATH')]))
+    # Both trees get their .pyc files written up front, as a release build would.
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', 'recipe_share'], cwd=tree, check=True)
+    cache_dir = tempfile.mkdtemp(prefix='recipe_share_templates_')
+    try:
+        env.update(TEMPLATE_CACHE_DIR=cache_dir, WARM_UP_ON_START='0')
+        measure(f'{name}: empty template cache', tree, env, runs, empty_cache=True)
+        measure(f'{name}: filled template cache', tree, env, runs)
+        env['WARM_UP_ON_START'] = '1'
+        measure(f'{name}: filled cache + warm-up', tree, env, runs)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--saves', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--before', help='Also measure this git revision.')
+    args = parser.parse_args()
+
+    from recipe_share import create_app, db
+    from benchmarks.seed import seed
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    with create_app().app_context():
+        db.create_all()
+        seed(args.users, args.posts, args.saves)
+
+    print(f'{"ms from process start":34} {"import":>8} {"app":>8} {"1st req":>8} {"1st page":>8} '
+          f'{"all " + str(len(PAGES)):>8}   scraper loaded')
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if args.before:
+        before = tempfile.mkdtemp(prefix='recipe_share_before_')
+        subprocess.run(['git', 'worktree', 'add', '--detach', before, args.before], cwd=here,
+                       check=True, capture_output=True)
+        try:
+            run_tree(args.before, before, args.runs)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', before], cwd=here, check=True)
+    run_tree('this tree', here, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Compares the old search_predictions path (load every title, substring scan)
+# with the in-process TitleIndex.
+#
+#   python -m benchmarks.bench_title_index --posts 1000000
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite://')
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from recipe_share import create_app, db
+from recipe_share.models import User, Post
+from recipe_share.posts.title_index import TitleIndex
+
+WORDS = ['chicken', 'beef', 'tomato', 'pasta', 'curry', 'lemon', 'garlic', 'pie', 'soup', 'salad',
+         'roast', 'spicy', 'creamy', 'mushroom', 'risotto', 'bake', 'stew', 'honey', 'ginger', 'tart']
+QUERIES = ['chi', 'pasta', 'lemon tart', 'urr', 'roast be', 'mushroom risotto', 'zzz', 'g']
+
+
+def seed(posts, users=100):
+    random.seed(1)
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+        for i in range(1, users + 1)
+    ])
+    batch = []
+    for i in range(1, posts + 1):
+        batch.append({
+            'id': i,
+            'title': ' '.join(random.sample(WORDS, random.randint(2, 4))).capitalize() + f' {i}',
+            'content': '', 'ingredients': '',
+            'private': random.random() < 0.2,
+            'user_id': random.randint(1, users),
+        })
+        if len(batch) == 10000:
+            db.session.execute(db.insert(Post), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(Post), batch)
+    db.session.commit()
+
+
+def old_path(query, user_id):
+    query = query.lower()
+    titles = [post.title for post in Post.query.filter_by(private=False).all()]
+    titles += [post.title for post in Post.query.filter_by(user_id=user_id).all()]
+    return list({title for title in titles if query in title.lower()})[:5]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--skip-old', action='store_true')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(args.posts)
+        index = TitleIndex()
+        start = time.perf_counter()
+        index.predictions('warm', user_id=1)
+        print(f'posts={args.posts} index build {time.perf_counter() - start:.2f}s')
+        for query in QUERIES:
+            new_ms = timed(lambda: index.predictions(query, user_id=1), 200)
+            line = f'{query!r:20} index {new_ms:8.3f} ms'
+            if not args.skip_old:
+                old_ms = timed(lambda: old_path(query, 1), 1)
+                line += f'   old {old_ms:10.1f} ms'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Seeds a SQLite database, then times `export-posts`/`import-posts` style
+# streaming in both directions and reports rows per second and peak memory.
+#
+#   python -m benchmarks.bench_transfer --posts 200000
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_transfer.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from recipe_share import create_app, db
+from recipe_share.models import Post
+from benchmarks.bench_indexes import seed
+from recipe_share.posts.transfer import iter_posts, iter_saves, iter_jsonl, import_jsonl
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--saves', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    app = create_app()
+    export_path = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_transfer.jsonl')
+    with app.app_context():
+        db.create_all()
+        seed(args.users, args.posts, args.saves)
+        print(f'seeded, peak RSS {peak_rss_mb():.0f} MB')
+
+        start = time.perf_counter()
+        lines = 0
+        with open(export_path, 'w', encoding='utf-8') as f:
+            for line in iter_jsonl(iter_posts(batch_size=args.batch_size)):
+                f.write(line)
+                lines += 1
+            for line in iter_jsonl(iter_saves(batch_size=args.batch_size)):
+                f.write(line)
+                lines += 1
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(export_path) / 1024 / 1024
+        print(f'export: {lines} rows, {size:.1f} MB in {elapsed:.2f}s '
+              f'({lines / elapsed:,.0f} rows/s), peak RSS {peak_rss_mb():.0f} MB')
+
+        start = time.perf_counter()
+        with open(export_path, encoding='utf-8') as f:
+            stats = import_jsonl(f, args.batch_size)
+        elapsed = time.perf_counter() - start
+        rows = stats['posts'] + stats['saves']
+        print(f'import: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s), '
+              f'skipped {stats["skipped"]}, peak RSS {peak_rss_mb():.0f} MB')
+        print(f'posts now {db.session.scalar(db.select(db.func.count(Post.id)))}')
+    os.remove(export_path)
+
+
+if __name__ == '__main__':
+    main()
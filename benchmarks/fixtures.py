@@ -0,0 +1,73 @@
+# A local stand-in for the recipe site the crawler reads. It serves every
+# collection in scraper.category_list and a deterministic recipe page per
+# link, in the same markup the parsers expect, with ETag support.
+import random
+import threading
+import zlib
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.seed import make_recipe
+
+
+def collection_page(category, recipes_per_collection):
+    cards = ''.join(
+        f'<div class="card__section card__content"><a href="/recipes/{category}-{i}">Recipe {i}</a></div>'
+        for i in range(recipes_per_collection))
+    # The parser drops the first link, which is the collection's own header.
+    header = '<div class="card__section card__content"><a href="/recipes/collection">All</a></div>'
+    return f'<html><body><div class="layout-md-rail__primary">{header}{cards}</div></body></html>'
+
+
+def recipe_page(slug):
+    title, ingredients, method = make_recipe(random.Random(zlib.crc32(slug.encode())))
+    items = ''.join(f'<li>{escape(line)}</li>' for line in ingredients)
+    steps = ''.join(f'<li>{escape(line)}</li>' for line in method)
+    return (f'<html><body><h1> {escape(title)} </h1><div class="row recipe__instructions">'
+            f'<div class="recipe__ingredients col-12 mt-md col-lg-6"><ul>{items}</ul></div>'
+            f'<div class="recipe__method-steps mb-lg col-12 col-lg-6"><ul>{steps}</ul></div>'
+            f'</div></body></html>')
+
+
+class FixtureSite:
+
+    def __init__(self, recipes_per_collection=40):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                site.requests += 1
+                if self.headers.get('If-None-Match') == '"fixture"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                path = self.path.strip('/')
+                if path.startswith('recipes/collection/') and path.endswith('-recipes'):
+                    category = path[len('recipes/collection/'):-len('-recipes')]
+                    body = collection_page(category, recipes_per_collection)
+                elif path.startswith('recipes/'):
+                    body = recipe_page(path[len('recipes/'):])
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('ETag', '"fixture"')
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
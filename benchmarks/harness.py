@@ -0,0 +1,228 @@
+# End-to-end benchmark of the hot endpoints against a seeded SQLite
+# database. The corpus for search_ingredients is crawled from a local
+# fixture site instead of the real one. Every endpoint is driven through
+# the Flask test client and through a real WSGI server over HTTP, and the
+# p50/p99 latency, throughput and SQL statements per request are printed and
+# written to a JSON report that a later run can be compared against.
+#
+#   python -m benchmarks.harness --posts 20000 --output before.json
+#   python -m benchmarks.harness --posts 20000 --compare before.json
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_harness.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('BCRYPT_WORKERS', '0')
+os.environ.setdefault('MAIL_OUTBOX_WORKER', 'none')
+
+import requests
+from sqlalchemy import event
+from werkzeug.serving import make_server
+from recipe_share import create_app, db
+from recipe_share.models import Post, User
+from recipe_share.posts.scraper import HostLimiter, crawl
+from benchmarks.fixtures import FixtureSite
+from benchmarks.seed import seed, PASSWORD
+
+
+class TestClientDriver:
+    name = 'client'
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        return self.app.test_client()
+
+    def request(self, client, method, path, data=None):
+        return client.open(path, method=method, data=data).status_code
+
+
+class WSGIDriver:
+    name = 'wsgi'
+
+    def __init__(self, app):
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server('127.0.0.1', 0, app, threaded=False)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def session(self):
+        return requests.Session()
+
+    def request(self, client, method, path, data=None):
+        response = client.request(method, self.base_url + path, data=data, allow_redirects=False)
+        response.content
+        return response.status_code
+
+    def close(self):
+        self.server.shutdown()
+
+
+def scenarios(titles, usernames, post_ids):
+    # name, signed in, method, endless iterator of (path, form data)
+    def cycle(values, make):
+        return (make(value) for value in itertools.cycle(values))
+
+    prefixes = ['chi', 'spicy', 'cr', 'lemony ch', 'pie', 'sausage t', 'b', 'smoky beef ch']
+    ingredient_searches = ['chicken\nonion\ngarlic', 'beef\nchopped tomatoes', 'lentil\ncoconut milk\nginger',
+                           'salmon\nlemon', 'mushroom\ndouble cream\nthyme']
+    return [
+        ('home', False, 'GET', cycle([1], lambda _: ('/home', None))),
+        ('home page 20', False, 'GET', cycle([20], lambda page: (f'/home?page={page}', None))),
+        ('home signed in', True, 'GET', cycle([1], lambda _: ('/home', None))),
+        ('post', False, 'GET', cycle(post_ids, lambda post_id: (f'/post/{post_id}', None))),
+        ('user_posts', False, 'GET', cycle(usernames, lambda name: (f'/user/{name}', None))),
+        ('saved_posts', True, 'GET', cycle([1], lambda _: ('/saved_posts', None))),
+        ('search_predictions', False, 'GET',
+         cycle(prefixes, lambda query: (f'/search_predictions?query={query}', None))),
+        ('handle_search', False, 'GET', cycle(titles, lambda title: (f'/handle_search?search={title}', None))),
+        ('search', False, 'GET', cycle(['chicken curry', 'creamy', 'lemon salmon'],
+                                       lambda query: (f'/search?q={query}', None))),
+        ('search_ingredients', True, 'POST',
+         cycle(ingredient_searches, lambda terms: ('/search_ingredients', {'ingredients': terms}))),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def run(driver, cases, requests_per_case, warmup, counter):
+    anonymous = driver.session()
+    signed_in = driver.session()
+    status = driver.request(signed_in, 'POST', '/login', {'email': 'user1@example.com', 'password': PASSWORD})
+    if status != 302:
+        raise RuntimeError(f'Could not sign in ({status})')
+    results = {}
+    for name, needs_login, method, paths in cases:
+        client = signed_in if needs_login else anonymous
+        for _ in range(warmup):
+            path, data = next(paths)
+            driver.request(client, method, path, data)
+        latencies = []
+        statuses = {}
+        queries_before = counter[0]
+        started = time.perf_counter()
+        for _ in range(requests_per_case):
+            path, data = next(paths)
+            start = time.perf_counter()
+            status = driver.request(client, method, path, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            'requests': requests_per_case,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'throughput_rps': round(requests_per_case / elapsed, 1),
+            'queries_per_request': round((counter[0] - queries_before) / requests_per_case, 2),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        }
+    return results
+
+
+def print_results(mode, results, baseline=None):
+    print(f'--- {mode}')
+    print(f'{"endpoint":20} {"p50 ms":>9} {"p99 ms":>9} {"req/s":>9} {"queries":>8}  statuses')
+    for name, result in results.items():
+        line = (f'{name:20} {result["p50_ms"]:9.2f} {result["p99_ms"]:9.2f} '
+                f'{result["throughput_rps"]:9.1f} {result["queries_per_request"]:8.2f}  {result["statuses"]}')
+        old = (baseline or {}).get(name)
+        if old:
+            change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0
+            line += f'  p50 {change:+.0f}% vs {old["p50_ms"]:.2f}'
+        print(line)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--saves', type=int, default=10000)
+    parser.add_argument('--recipes-per-collection', type=int, default=40)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint.')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--mode', choices=['client', 'wsgi', 'both'], default='both')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the JSON report here.')
+    parser.add_argument('--compare', help='A previous JSON report to compare against.')
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    site = FixtureSite(args.recipes_per_collection)
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, SCRAPER_BASE_URL=site.start())
+    counter = [0]
+    with app.app_context():
+        db.create_all()
+        seed(args.users, args.posts, args.saves, args.seed)
+        corpus = asyncio.run(crawl(HostLimiter(8, 0)))
+        rng = random.Random(args.seed)
+        public = db.session.execute(db.select(Post.id, Post.title).where(Post.private == False)).all()
+        sample = rng.sample(public, min(50, len(public)))
+        usernames = db.session.scalars(db.select(User.username).limit(50)).all()
+
+        @event.listens_for(db.engine, 'after_cursor_execute')
+        def count_query(*_):
+            counter[0] += 1
+    site.stop()
+    print(f'seeded {args.posts} posts, crawled {corpus["recipes"]} fixture recipes')
+
+    drivers = {'client': [TestClientDriver], 'wsgi': [WSGIDriver],
+               'both': [TestClientDriver, WSGIDriver]}[args.mode]
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'],
+            'params': vars(args),
+        },
+        'results': {},
+    }
+    for driver_class in drivers:
+        driver = driver_class(app)
+        cases = scenarios([title for _, title in sample], usernames, [post_id for post_id, _ in sample])
+        results = run(driver, cases, args.requests, args.warmup, counter)
+        if hasattr(driver, 'close'):
+            driver.close()
+        report['results'][driver.name] = results
+        print_results(driver.name, results, (baseline or {}).get(driver.name))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
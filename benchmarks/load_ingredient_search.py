@@ -0,0 +1,109 @@
+# Ingredient searches per second from concurrent signed-in users against a
+# threaded WSGI server, with the corpus crawled from the local fixture site.
+# Users pick from a small set of searches so that identical ones overlap, as
+# they do when a popular combination is going round; the run is repeated
+# with coalescing disabled for comparison.
+#
+#   python -m benchmarks.load_ingredient_search --users 50 --searches 1000
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_ingredients.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('BCRYPT_WORKERS', '0')
+os.environ.setdefault('MAIL_OUTBOX_WORKER', 'none')
+
+import requests
+from werkzeug.serving import make_server
+from recipe_share import create_app, db
+from recipe_share.posts import corpus
+from recipe_share.posts.scraper import HostLimiter, crawl
+from benchmarks.fixtures import FixtureSite
+from benchmarks.harness import percentile
+from benchmarks.seed import seed, PASSWORD
+
+SEARCHES = ['chicken\nonion\ngarlic', 'beef\nchopped tomatoes', 'lentil\ncoconut milk\nginger',
+            'salmon\nlemon', 'mushroom\ndouble cream\nthyme', 'pork\nhoney\nsoy sauce',
+            'chickpea\nspinach', 'lamb\nrosemary\npotatoes']
+
+
+def setup(recipes_per_collection, users):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    site = FixtureSite(recipes_per_collection)
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, SCRAPER_BASE_URL=site.start())
+    with app.app_context():
+        db.create_all()
+        seed(users, 0, 0)
+        stats = asyncio.run(crawl(HostLimiter(8, 0)))
+    site.stop()
+    print(f'crawled {stats["recipes"]} fixture recipes')
+    return app
+
+
+def sign_in(base, n):
+    session = requests.Session()
+    response = session.post(base + '/login', data={'email': f'user{n}@example.com', 'password': PASSWORD},
+                            allow_redirects=False)
+    assert response.status_code == 302, response.status_code
+    return session
+
+
+def run(app, label, users, searches):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    sessions = [sign_in(base, n) for n in range(1, users + 1)]
+    latencies = []
+    before = corpus.corpus_searches.stats()
+
+    def search(i):
+        rng = random.Random(i)
+        start = time.perf_counter()
+        response = sessions[i % users].post(base + '/search_ingredients',
+                                            data={'ingredients': rng.choice(SEARCHES)})
+        latencies.append((time.perf_counter() - start) * 1000)
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(users) as pool:
+        statuses = list(pool.map(search, range(searches)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    after = corpus.corpus_searches.stats()
+    shared = after['shared'] - before['shared']
+    print(f'{label:12} {searches / elapsed:8.1f} searches/s  p50 {percentile(latencies, 50):7.1f} ms  '
+          f'p99 {percentile(latencies, 99):7.1f} ms  shared {shared:5}  '
+          f'errors {sum(status != 200 for status in statuses)}')
+
+
+def main():
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--searches', type=int, default=1000)
+    parser.add_argument('--recipes-per-collection', type=int, default=40)
+    args = parser.parse_args()
+
+    app = setup(args.recipes_per_collection, args.users)
+    run(app, 'coalesced', args.users, args.searches)
+    corpus_searches = corpus.corpus_searches
+    # Every search scores the corpus itself.
+    corpus.corpus_searches = type('NoCoalescing', (), {'do': lambda self, key, fn, *args: fn(*args),
+                                                         'stats': corpus_searches.stats})()
+    run(app, 'uncoalesced', args.users, args.searches)
+    corpus.corpus_searches = corpus_searches
+
+
+if __name__ == '__main__':
+    main()
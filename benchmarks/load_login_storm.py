@@ -0,0 +1,100 @@
+# Measures home-feed latency while a storm of logins runs against a local
+# threaded WSGI server, with bcrypt in the worker pool and inline.
+#
+#   python -m benchmarks.load_login_storm --logins 200 --concurrency 16
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'recipe_share_bench_login.db')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + DB_PATH)
+os.environ.setdefault('SECRET_KEY', 'bench')
+
+from werkzeug.serving import make_server
+from recipe_share import create_app, db
+from recipe_share.models import User, Post
+from recipe_share.users import passwords
+
+
+def serve(workers):
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, BCRYPT_WORKERS=workers, BCRYPT_MAX_PENDING=64,
+                      BCRYPT_QUEUE_TIMEOUT=30)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='storm', email='storm@example.com',
+                            password=passwords._hash('hunter2', app.config['BCRYPT_LOG_ROUNDS'])))
+        db.session.add_all([Post(title=f'Recipe {i}', content='c', ingredients='i', private=False, user_id=1)
+                            for i in range(50)])
+        db.session.commit()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, server
+
+
+def login(base):
+    data = urllib.parse.urlencode({'email': 'storm@example.com', 'password': 'hunter2'}).encode()
+    urllib.request.urlopen(base + '/login', data=data).read()
+
+
+def sample_home(base, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        urllib.request.urlopen(base + '/home').read()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def run(workers, logins, concurrency):
+    app, server = serve(workers)
+    base = f'http://127.0.0.1:{server.server_port}'
+    idle = []
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_home, args=(base, stop, idle))
+    sampler.start()
+    time.sleep(1)
+    stop.set()
+    sampler.join()
+
+    busy = []
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_home, args=(base, stop, busy))
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: login(base), range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    server.shutdown()
+    with app.app_context():
+        passwords.shutdown()
+
+    def p(values, q):
+        return statistics.quantiles(values, n=100)[q - 1]
+    label = f'pool({workers})' if workers else 'inline'
+    print(f'{label:8} logins/s {logins / elapsed:6.1f}  home p50 idle {p(idle, 50):6.1f} ms  '
+          f'storm {p(busy, 50):6.1f} ms  p99 idle {p(idle, 99):6.1f} ms  storm {p(busy, 99):6.1f} ms')
+
+
+def main():
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+    run(0, args.logins, args.concurrency)
+    run(args.workers, args.logins, args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Fills the configured database with a reproducible synthetic dataset:
+# users, posts with realistic ingredient lists and methods, and saved posts.
+# Every user's password is "password".
+#
+#   python -m benchmarks.seed --users 1000 --posts 100000 --saves 50000
+import argparse
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+import bcrypt
+
+PASSWORD = 'password'
+
+ADJECTIVES = ['Easy', 'Spicy', 'Creamy', 'Classic', 'Smoky', 'Lemony', 'Herby', 'Quick', 'Slow-cooked',
+              'Crispy', 'Sticky', 'Roasted', 'Summer', 'Winter', 'Healthy', 'One-pot', 'Cheesy', 'Garlicky']
+MAINS = ['chicken', 'beef', 'lamb', 'pork', 'salmon', 'prawn', 'tofu', 'chickpea', 'lentil', 'mushroom',
+         'sweet potato', 'aubergine', 'cauliflower', 'sausage', 'halloumi', 'squash', 'bean', 'cod']
+DISHES = ['curry', 'pie', 'stew', 'salad', 'soup', 'tart', 'risotto', 'pasta bake', 'traybake', 'burger',
+          'tacos', 'stir-fry', 'noodles', 'casserole', 'lasagne', 'chilli', 'skewers', 'frittata']
+PANTRY = ['onion', 'red onion', 'garlic cloves', 'olive oil', 'vegetable oil', 'butter', 'plain flour',
+          'chopped tomatoes', 'tomato purée', 'vegetable stock', 'chicken stock', 'double cream',
+          'crème fraîche', 'parmesan', 'cheddar', 'mozzarella', 'eggs', 'milk', 'rice', 'basmati rice',
+          'spaghetti', 'penne', 'egg noodles', 'soy sauce', 'honey', 'lemon', 'lime', 'fresh coriander',
+          'flat-leaf parsley', 'thyme', 'rosemary', 'bay leaves', 'ground cumin', 'smoked paprika',
+          'chilli flakes', 'garam masala', 'turmeric', 'ginger', 'spring onions', 'carrots', 'celery',
+          'peppers', 'spinach', 'frozen peas', 'potatoes', 'coconut milk', 'Dijon mustard', 'sugar',
+          'red wine vinegar', 'Greek yogurt', 'puff pastry', 'breadcrumbs', 'pine nuts', 'cherry tomatoes']
+AMOUNTS = ['1', '2', '3', '4', '100g', '150g', '200g', '250g', '400g', '500g', '1 tbsp', '2 tbsp',
+           '1 tsp', '½ tsp', '100ml', '300ml', '500ml', '1 x 400g can', 'a pinch of', 'a handful of']
+STEPS = ['Heat the oil in a large pan over a medium heat.', 'Fry the onion for 8-10 mins until soft.',
+         'Stir in the garlic and spices and cook for 1 min more.', 'Add the {main} and brown all over.',
+         'Pour in the stock and bring to a simmer.', 'Cover and cook gently for 30 mins.',
+         'Season to taste and scatter over the herbs.', 'Heat oven to 200C/180C fan/gas 6.',
+         'Bake for 25-30 mins until golden and bubbling.', 'Serve with rice, bread or a green salad.']
+
+
+def make_recipe(rng):
+    main = rng.choice(MAINS)
+    title = f'{rng.choice(ADJECTIVES)} {main} {rng.choice(DISHES)}'
+    ingredients = [f'{rng.choice(["400g", "500g", "2", "4", "600g"])} {main}']
+    ingredients += [f'{rng.choice(AMOUNTS)} {item}' for item in rng.sample(PANTRY, rng.randint(4, 13))]
+    method = [step.format(main=main) for step in sorted(rng.sample(STEPS, rng.randint(3, 7)), key=STEPS.index)]
+    return title, ingredients, method
+
+
+def seed(users, posts, saves, seed_value=1, batch_size=5000):
+    # Needs an app context.
+    from recipe_share import db
+    from recipe_share.models import User, Post, SavePost, add_save_counts
+    from flask import current_app
+
+    rng = random.Random(seed_value)
+    rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds)).decode()
+    db.session.execute(db.insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': password}
+        for i in range(1, users + 1)
+    ])
+    user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+
+    start = datetime(2022, 1, 1)
+    for first in range(0, posts, batch_size):
+        rows = []
+        for i in range(first, min(first + batch_size, posts)):
+            title, ingredients, method = make_recipe(rng)
+            posted = start + timedelta(minutes=7 * i)
+            rows.append({'title': title, 'content': ' '.join(method), 'ingredients': '\n'.join(ingredients),
+                         'private': rng.random() < 0.1, 'display': True, 'user_id': rng.choice(user_ids),
+                         'date_posted': posted, 'updated_at': posted})
+        db.session.execute(db.insert(Post), rows)
+        db.session.commit()
+
+    post_ids = db.session.scalars(db.select(Post.id).where(Post.private == False)).all()
+    pairs = set()
+    # Popular posts get most of the saves, like a real site.
+    while len(pairs) < min(saves, len(user_ids) * len(post_ids)):
+        if rng.random() < 0.5:
+            post_id = post_ids[min(int(rng.paretovariate(1.2)) - 1, len(post_ids) - 1)]
+        else:
+            post_id = rng.choice(post_ids)
+        pairs.add((rng.choice(user_ids), post_id))
+    pairs = list(pairs)
+    for first in range(0, len(pairs), batch_size):
+        db.session.execute(db.insert(SavePost), [{'user_id': u, 'post_id': p} for u, p in pairs[first:first + batch_size]])
+    add_save_counts(Counter(p for _, p in pairs))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--saves', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from recipe_share import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(args.users, args.posts, args.saves, args.seed)
+    print(f'Seeded {args.users} users, {args.posts} posts, {args.saves} saved posts')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import os
+
+# gunicorn -c gunicorn.conf.py run:app
+#
+# preload_app builds the app (templates compiled, indexes loaded when
+# WARM_UP_ON_START is on) once in the master, and the forked workers share
+# that memory copy-on-write. Each worker then opens its own DB connections.
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+preload_app = True
+
+
+def post_fork(server, worker):
+    from recipe_share.startup import after_fork
+    from run import app
+    after_fork(app)
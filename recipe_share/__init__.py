@@ -1,15 +1,15 @@
+import os
 from flask import Flask
 from flask_mail import Mail
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from urllib.parse import urlencode
-from recipe_share.config import Config
+from recipe_share.config import config_profiles
+from recipe_share.database import RoutingSession, configure_engines, apply_sqlite_pragmas
 
 
 
-db = SQLAlchemy()
-bcrypt = Bcrypt()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 login_manager.login_view = 'users.login'
 login_manager.login_message_category = 'info'
@@ -19,12 +19,16 @@ mail = Mail()
 
 
  
-def create_app(config_class=Config):
+def create_app(config_class=None):
+    if config_class is None:
+        config_class = config_profiles[os.environ.get('RECIPE_SHARE_CONFIG', 'default')]
     app = Flask(__name__)
-    app.config.from_object(Config)  
+    app.config.from_object(config_class)
+    configure_engines(app.config)
 
     db.init_app(app)
-    bcrypt.init_app(app)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engines, app.config)
     login_manager.init_app(app)
     mail.init_app(app)
 
@@ -38,5 +42,27 @@ def create_app(config_class=Config):
     app.register_blueprint(main)
     app.register_blueprint(errors)
 
+    from recipe_share.commands import create_indexes_command, repair_save_counts_command
+    from recipe_share.posts.commands import crawl_command, export_posts_command, import_posts_command
+    app.cli.add_command(create_indexes_command)
+    app.cli.add_command(repair_save_counts_command)
+    app.cli.add_command(crawl_command)
+    app.cli.add_command(export_posts_command)
+    app.cli.add_command(import_posts_command)
+
+    from recipe_share.users import outbox
+    outbox.init_app(app)
+
+    from recipe_share.users.images import avatar_url
+    from recipe_share.fragments import fragment_cache, post_card, post_body
+    fragment_cache.init_app(app)
+    from recipe_share import http_cache, metrics
+    http_cache.init_app(app)
+    metrics.init_app(app)
+    app.jinja_env.globals.update(avatar_url=avatar_url, post_card=post_card, post_body=post_body)
+
+    from recipe_share import startup
+    startup.init_app(app)
+
     return app
 
@@ -0,0 +1,120 @@
+import warnings
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import SAWarning
+from recipe_share import db
+from recipe_share.models import User, Post, SavePost, ScrapedRecipe, fromSearch, normalize_title
+from recipe_share.posts.fulltext import setup_fulltext
+
+
+def dedupe_saved_posts():
+    # Keeps the oldest SavePost row for each (user_id, post_id) pair so the
+    # unique index can be built on databases that predate it.
+    keep = db.select(db.func.min(SavePost.id)).group_by(SavePost.user_id, SavePost.post_id)
+    result = db.session.execute(db.delete(SavePost).where(SavePost.id.not_in(keep)))
+    db.session.commit()
+    return result.rowcount
+
+
+def backfill_title_keys(batch_size=1000):
+    count = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(db.select(Post.id, Post.title, Post.updated_at).where(Post.id > last_id)
+                                  .order_by(Post.id).limit(batch_size)).all()
+        if not rows:
+            return count
+        # updated_at is passed through so the backfill does not look like an edit.
+        db.session.execute(db.update(Post), [
+            {'id': post_id, 'title_key': normalize_title(title), 'updated_at': updated_at}
+            for post_id, title, updated_at in rows])
+        db.session.commit()
+        count += len(rows)
+        last_id = rows[-1][0]
+
+
+def repair_save_counts():
+    # Recounts every post's saves and fixes the ones that drifted, e.g. after
+    # a bulk import or a write that bypassed the ORM. Returns how many.
+    actual = db.select(db.func.count(SavePost.id)).where(SavePost.post_id == Post.id).scalar_subquery()
+    result = db.session.execute(
+        db.update(Post).where(Post.save_count != actual)
+        .values(save_count=actual, updated_at=Post.updated_at)
+        .execution_options(synchronize_session=False))
+    db.session.commit()
+    return result.rowcount
+
+
+@click.command('repair-save-counts')
+@with_appcontext
+def repair_save_counts_command():
+    """Recount Post.save_count from the saved posts."""
+    click.echo(f'Fixed {repair_save_counts()} save counts')
+
+
+@click.command('create-indexes')
+@with_appcontext
+def create_indexes_command():
+    """Create missing tables and indexes on an existing database."""
+    inspector = db.inspect(db.engine)
+    recount = False
+    if inspector.has_table(fromSearch.__tablename__):
+        columns = {column['name'] for column in inspector.get_columns(fromSearch.__tablename__)}
+        if 'result_set' not in columns:
+            # Only ever holds transient search results, so rebuild it.
+            fromSearch.__table__.drop(db.engine)
+            click.echo('Recreated from_search')
+    if inspector.has_table(Post.__tablename__):
+        columns = {column['name'] for column in inspector.get_columns(Post.__tablename__)}
+        if 'updated_at' not in columns:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE post ADD COLUMN updated_at TIMESTAMP')
+                conn.exec_driver_sql('UPDATE post SET updated_at = date_posted')
+            click.echo('Added post.updated_at')
+        if 'title_key' not in columns:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE post ADD COLUMN title_key VARCHAR(100)')
+            click.echo(f'Added post.title_key for {backfill_title_keys()} posts')
+        if 'save_count' not in columns:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE post ADD COLUMN save_count INTEGER NOT NULL DEFAULT 0')
+            click.echo('Added post.save_count')
+            recount = True
+        if 'import_id' not in columns:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE post ADD COLUMN import_id INTEGER')
+            click.echo('Added post.import_id')
+        with db.engine.begin() as conn:
+            # Feed validators take max(updated_at) on its own.
+            filled = conn.exec_driver_sql(
+                'UPDATE post SET updated_at = date_posted WHERE updated_at IS NULL').rowcount
+        if filled:
+            click.echo(f'Filled post.updated_at for {filled} posts')
+    if inspector.has_table(User.__tablename__):
+        columns = {column['name'] for column in inspector.get_columns(User.__tablename__)}
+        if 'updated_at' not in columns:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE "user" ADD COLUMN updated_at TIMESTAMP')
+            click.echo('Added user.updated_at')
+    if inspector.has_table(ScrapedRecipe.__tablename__):
+        columns = {column['name'] for column in inspector.get_columns(ScrapedRecipe.__tablename__)}
+        if 'revision' not in columns:
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE scraped_recipe ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+            click.echo('Added scraped_recipe.revision')
+    if inspector.has_table(SavePost.__tablename__):
+        removed = dedupe_saved_posts()
+        if removed:
+            click.echo(f'Removed {removed} duplicate saved posts')
+        if removed or recount:
+            click.echo(f'Fixed {repair_save_counts()} save counts')
+    db.create_all()
+    with warnings.catch_warnings():
+        # SQLite reflection cannot see expression indexes.
+        warnings.simplefilter('ignore', SAWarning)
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+                click.echo(f'{index.name} ok')
+    if setup_fulltext():
+        click.echo('full-text search ok')
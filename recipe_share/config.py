@@ -1,12 +1,126 @@
 import os
+import tempfile
 
 class Config:
     MAIL_USERNAME = os.environ.get('EMAIL_USER')
     MAIL_PASSWORD = os.environ.get('EMAIL_PASS')
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI')
+    # Read-only feed and search pages query this database when set.
+    DATABASE_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URI')
+    # Seconds a user stays on the primary after writing anything.
+    DATABASE_REPLICA_PIN = int(os.environ.get('DATABASE_REPLICA_PIN', 10))
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    # Seconds before a pooled connection is replaced; -1 keeps them forever.
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', -1))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '0') == '1'
+    DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 500))
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
 
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
     MAIL_USE_TLS = True
-    
\ No newline at end of file
+    MAIL_OUTBOX_WORKER = os.environ.get('MAIL_OUTBOX_WORKER', 'thread')
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE', 20))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS', 6))
+    MAIL_OUTBOX_RETRY_DELAY = int(os.environ.get('MAIL_OUTBOX_RETRY_DELAY', 30))
+    MAIL_OUTBOX_LOCK_TIMEOUT = int(os.environ.get('MAIL_OUTBOX_LOCK_TIMEOUT', 120))
+    MAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get('MAIL_OUTBOX_POLL_INTERVAL', 5))
+    # Seconds to keep delivered (or abandoned) mail before deleting it.
+    MAIL_OUTBOX_RETENTION = int(os.environ.get('MAIL_OUTBOX_RETENTION', 86400))
+
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 2))
+    BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 16))
+    BCRYPT_QUEUE_TIMEOUT = float(os.environ.get('BCRYPT_QUEUE_TIMEOUT', 2))
+
+    SCRAPER_BASE_URL = os.environ.get('SCRAPER_BASE_URL', 'https://www.bbcgoodfood.com')
+    SCRAPER_CACHE_TTL = int(os.environ.get('SCRAPER_CACHE_TTL', 24 * 60 * 60))
+    SCRAPER_CONCURRENCY_PER_HOST = int(os.environ.get('SCRAPER_CONCURRENCY_PER_HOST', 4))
+    SCRAPER_REQUESTS_PER_SECOND = float(os.environ.get('SCRAPER_REQUESTS_PER_SECOND', 5))
+    SCRAPER_MAX_CONNECTIONS = int(os.environ.get('SCRAPER_MAX_CONNECTIONS', 100))
+    SCRAPER_TIMEOUT = float(os.environ.get('SCRAPER_TIMEOUT', 30))
+    SCRAPER_CONNECT_TIMEOUT = float(os.environ.get('SCRAPER_CONNECT_TIMEOUT', 10))
+    SCRAPER_RETRIES = int(os.environ.get('SCRAPER_RETRIES', 2))
+    SCRAPER_RETRY_BACKOFF = float(os.environ.get('SCRAPER_RETRY_BACKOFF', 0.5))
+    SCRAPER_DNS_CACHE_TTL = int(os.environ.get('SCRAPER_DNS_CACHE_TTL', 300))
+    # Processes parsing fetched pages; 0 parses in a thread of the crawling process.
+    SCRAPER_PARSE_WORKERS = int(os.environ.get('SCRAPER_PARSE_WORKERS', 0))
+
+    FEED_PAGINATION = os.environ.get('FEED_PAGINATION', 'offset')
+    FEED_PAGE_SIZE = int(os.environ.get('FEED_PAGE_SIZE', 5))
+    FEED_COUNT_TTL = int(os.environ.get('FEED_COUNT_TTL', 60))
+    MOST_SAVED_SIZE = int(os.environ.get('MOST_SAVED_SIZE', 100))
+    MOST_SAVED_REFRESH = int(os.environ.get('MOST_SAVED_REFRESH', 60))
+    SAVE_BATCH_MAX_OPERATIONS = int(os.environ.get('SAVE_BATCH_MAX_OPERATIONS', 100))
+
+    SEARCH_RESULTS_TTL = int(os.environ.get('SEARCH_RESULTS_TTL', 60 * 60))
+    SEARCH_RESULTS_CLEANUP_INTERVAL = int(os.environ.get('SEARCH_RESULTS_CLEANUP_INTERVAL', 5 * 60))
+    # How often each process checks the database for titles written elsewhere.
+    TITLE_INDEX_REFRESH = float(os.environ.get('TITLE_INDEX_REFRESH', 1))
+    # Likewise for the posts in the ingredient index.
+    INGREDIENT_INDEX_REFRESH = float(os.environ.get('INGREDIENT_INDEX_REFRESH', 1))
+    # Best matches kept from an ingredient search, per source.
+    INGREDIENT_SEARCH_LIMIT = int(os.environ.get('INGREDIENT_SEARCH_LIMIT', 100))
+    # Exact-title lookups for the search box, hits and misses alike.
+    TITLE_LOOKUP_TTL = int(os.environ.get('TITLE_LOOKUP_TTL', 60))
+    TITLE_LOOKUP_MAX_ENTRIES = int(os.environ.get('TITLE_LOOKUP_MAX_ENTRIES', 10000))
+
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    IMAGE_SIZES = (65, 130, 250)
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 1))
+    IMAGE_WORKER_MEMORY_MB = int(os.environ.get('IMAGE_WORKER_MEMORY_MB', 1024))
+    IMAGE_MAX_PENDING = int(os.environ.get('IMAGE_MAX_PENDING', 8))
+    IMAGE_QUEUE_TIMEOUT = float(os.environ.get('IMAGE_QUEUE_TIMEOUT', 2))
+    IMAGE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', '1') == '1'
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    # e.g. redis://localhost:6379/0, or file:///tmp/recipe_share_fragments for a shared directory
+    FRAGMENT_CACHE_URL = os.environ.get('FRAGMENT_CACHE_URL')
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 24 * 60 * 60))
+
+    STATIC_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    # When set, /metrics and /stats/fragment-cache require
+    # "Authorization: Bearer <token>".
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Refuse to start without METRICS_TOKEN (on in production).
+    METRICS_REQUIRE_TOKEN = os.environ.get('METRICS_REQUIRE_TOKEN', '0') == '1'
+    # Profile every request and dump those slower than this many ms; 0 is off.
+    METRICS_PROFILE_SLOW_MS = int(os.environ.get('METRICS_PROFILE_SLOW_MS', 0))
+    METRICS_PROFILE_DIR = os.environ.get('METRICS_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'recipe_share_profiles'))
+    # Compiled templates; `flask compile-templates` fills it ahead of time.
+    # Unset means Jinja's private per-user directory under the temp dir.
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    # Compile templates, open the DB pool and load the search indexes in create_app.
+    WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', '0') == '1'
+
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    # Mail goes out from a separate `flask mail-worker` process.
+    MAIL_OUTBOX_WORKER = os.environ.get('MAIL_OUTBOX_WORKER', 'none')
+    WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', '1') == '1'
+    METRICS_REQUIRE_TOKEN = os.environ.get('METRICS_REQUIRE_TOKEN', '1') == '1'
+
+
+# Picked with RECIPE_SHARE_CONFIG=production.
+config_profiles = {
+    'default': Config,
+    'production': ProductionConfig,
+}
@@ -0,0 +1,144 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, session as user_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select
+
+# Engine and pool configuration. configure_engines() turns the DB_* and
+# SQLITE_* settings into SQLALCHEMY_ENGINE_OPTIONS (and a `replica` bind when
+# DATABASE_REPLICA_URI is set), failing at startup on values that would only
+# break later. Views decorated with @read_replica send their SELECTs to the
+# replica; everything else, and every write, stays on the primary.
+
+_POOL_SETTINGS = {
+    # setting: (engine option, type, minimum)
+    'DB_POOL_SIZE': ('pool_size', int, 1),
+    'DB_MAX_OVERFLOW': ('max_overflow', int, 0),
+    'DB_POOL_TIMEOUT': ('pool_timeout', float, 0),
+    'DB_POOL_RECYCLE': ('pool_recycle', int, -1),
+}
+_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+_SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def _number(config, key, kind, minimum):
+    value = config.get(key)
+    if value is None:
+        return None
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be a number, got {value!r}')
+    if value < minimum:
+        raise ValueError(f'{key} must be at least {minimum}, got {value}')
+    return value
+
+
+def _is_memory(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _options_for(uri, config):
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if not _is_memory(uri):
+        # In-memory SQLite uses a single shared connection, so no pool to size.
+        for key, (option, kind, minimum) in _POOL_SETTINGS.items():
+            value = _number(config, key, kind, minimum)
+            if value is not None:
+                options[option] = value
+    options['pool_pre_ping'] = bool(config.get('DB_POOL_PRE_PING'))
+    cache_size = _number(config, 'DB_STATEMENT_CACHE_SIZE', int, 0)
+    if cache_size is not None:
+        options['query_cache_size'] = cache_size
+    return options
+
+
+def configure_engines(config):
+    uri = config.get('SQLALCHEMY_DATABASE_URI')
+    if not uri:
+        raise ValueError('SQLALCHEMY_DATABASE_URI is not set')
+    journal_mode = str(config.get('SQLITE_JOURNAL_MODE', 'WAL')).upper()
+    if journal_mode not in _JOURNAL_MODES:
+        raise ValueError(f'SQLITE_JOURNAL_MODE must be one of {sorted(_JOURNAL_MODES)}')
+    synchronous = str(config.get('SQLITE_SYNCHRONOUS', 'NORMAL')).upper()
+    if synchronous not in _SYNCHRONOUS:
+        raise ValueError(f'SQLITE_SYNCHRONOUS must be one of {sorted(_SYNCHRONOUS)}')
+    _number(config, 'SQLITE_MMAP_SIZE', int, 0)
+    _number(config, 'SQLITE_BUSY_TIMEOUT', int, 0)
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = _options_for(uri, config)
+    replica = config.get('DATABASE_REPLICA_URI')
+    if replica:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds['replica'] = {'url': replica, **_options_for(replica, config)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def _sqlite_pragmas(config):
+    pragmas = [
+        f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE') or 0)}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT') or 0)}",
+    ]
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return on_connect
+
+
+def apply_sqlite_pragmas(engines, config):
+    for engine in engines.values():
+        if engine.dialect.name == 'sqlite' and not _is_memory(str(engine.url)):
+            event.listen(engine, 'connect', _sqlite_pragmas(config))
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and isinstance(clause, Select) and not self._flushing
+                and has_app_context() and g.get('read_replica')):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_write(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_to_primary(session):
+    if session.info.pop('wrote', False) and has_request_context() and current_app.config.get('DATABASE_REPLICA_URI'):
+        user_session['primary_until'] = time.time() + current_app.config['DATABASE_REPLICA_PIN']
+        g.read_replica = False
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_write(session, previous_transaction):
+    session.info.pop('wrote', None)
+
+
+def from_replica():
+    # True while this request's SELECTs go to the replica; caches must not
+    # keep what they read then.
+    return (has_app_context() and g.get('read_replica', False)
+            and bool(current_app.config.get('DATABASE_REPLICA_URI')))
+
+
+def read_replica(view):
+    # For views that only read and can tolerate replication lag.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = user_session.get('primary_until', 0) < time.time()
+        return view(*args, **kwargs)
+    return wrapper
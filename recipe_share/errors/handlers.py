@@ -14,3 +14,6 @@ def error_403(error):
 def error_500(error):
     return render_template('errors/500.html'), 500
 
+@errors.app_errorhandler(503)
+def error_503(error):
+    return render_template('errors/503.html'), 503, {'Retry-After': '5'}
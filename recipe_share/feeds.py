@@ -0,0 +1,227 @@
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime
+from flask import abort, current_app, request
+from flask_login import current_user
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+from recipe_share import db
+from recipe_share.database import from_replica
+from recipe_share.models import Post, SavePost, User, DeletedPost
+from recipe_share.users.cache import SavedIds, saved_post_ids as cached_saved_post_ids
+
+# Feed queries shared by the main, users and posts blueprints. Authors are
+# loaded with one extra SELECT ... IN per page rather than lazily per post, so
+# a page costs the same handful of queries whatever its size.
+
+
+def post_feed(*criteria):
+    return (Post.query.options(selectinload(Post.author))
+            .filter(Post.display == True, *criteria)
+            .order_by(Post.date_posted.desc()))
+
+
+def public_feed():
+    return post_feed()
+
+
+def user_feed(user_id):
+    return post_feed(Post.user_id == user_id)
+
+
+def saved_feed(user_id):
+    return (Post.query.options(selectinload(Post.author))
+            .join(SavePost, SavePost.post_id == Post.id)
+            .filter(SavePost.user_id == user_id)
+            .order_by(SavePost.id.desc()))
+
+
+def _latest(column, *criteria):
+    return db.select(db.func.max(column)).where(*criteria).scalar_subquery()
+
+
+def feed_version(user_id=None):
+    # The last edit, newest id and last delete among the posts a feed draws
+    # from (all of them, or one author's), plus the last change to any user
+    # for the author names and pictures on the cards. Each is a max() over an
+    # index, so checking it costs the same however many posts there are.
+    posts = [Post.user_id == user_id] if user_id is not None else []
+    deleted = [DeletedPost.user_id == user_id] if user_id is not None else []
+    return db.session.execute(db.select(
+        _latest(Post.updated_at, *posts), _latest(Post.id, *posts),
+        _latest(DeletedPost.id, *deleted), _latest(User.updated_at))).one()
+
+
+def post_keyset():
+    return [Post.date_posted, Post.id]
+
+
+def saved_keyset():
+    return [SavePost.id]
+
+
+def saved_post_ids():
+    if not current_user.is_authenticated:
+        return SavedIds()
+    return cached_saved_post_ids(current_user.id)
+
+
+class KeysetPage:
+    # One page of a feed fetched by seeking past a (date_posted, id) style key
+    # instead of OFFSET, so every page costs the same. Tokens are opaque to the
+    # client; `total` is a per-process cached count and may lag slightly.
+
+    def __init__(self, items, next_token, prev_token, count):
+        self.items = items
+        self.next_token = next_token
+        self.prev_token = prev_token
+        self._count = count
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_token is not None
+
+    @property
+    def total(self):
+        return self._count()
+
+
+_counts = {}
+_counts_lock = threading.Lock()
+
+
+def cached_count(key, query):
+    ttl = current_app.config['FEED_COUNT_TTL']
+    now = time.monotonic()
+    with _counts_lock:
+        cached = _counts.get(key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+    value = query.order_by(None).count()
+    if from_replica():
+        return value
+    with _counts_lock:
+        _counts[key] = (value, now + ttl)
+    return value
+
+
+def _encode(direction, values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps([direction, values]).encode()).decode().rstrip('=')
+
+
+def _decode(token, columns):
+    try:
+        direction, values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if direction not in ('next', 'prev') or len(values) != len(columns):
+            raise ValueError(token)
+        values = [datetime.fromisoformat(value) if isinstance(column.type, db.DateTime) else value
+                  for column, value in zip(columns, values)]
+    except (ValueError, TypeError, binascii.Error):
+        abort(400)
+    return direction, values
+
+
+def keyset_paginate(query, columns, count_key, token=None, per_page=5):
+    # `columns` is the descending sort key, most significant first, and must
+    # end in a unique column.
+    count_query = query
+    query = query.order_by(None).add_columns(*columns)
+    key = tuple_(*columns)
+    direction, values = _decode(token, columns) if token else ('next', None)
+    if direction == 'next':
+        if values is not None:
+            query = query.filter(key < tuple_(*values))
+        rows = query.order_by(*[column.desc() for column in columns]).limit(per_page + 1).all()
+        more, items = len(rows) > per_page, rows[:per_page]
+        has_next, has_prev = more, values is not None
+    else:
+        query = query.filter(key > tuple_(*values))
+        rows = query.order_by(*columns).limit(per_page + 1).all()
+        more, items = len(rows) > per_page, rows[:per_page][::-1]
+        has_next, has_prev = True, more
+
+    next_token = _encode('next', items[-1][1:]) if has_next and items else None
+    prev_token = _encode('prev', items[0][1:]) if has_prev and items else None
+    return KeysetPage([row[0] for row in items], next_token, prev_token,
+                      lambda: cached_count(count_key, count_query))
+
+
+def paginate_feed(query, columns, count_key, per_page=None):
+    # Keyset pages when a cursor is passed or FEED_PAGINATION is 'keyset',
+    # otherwise the classic numbered pages.
+    per_page = per_page or current_app.config['FEED_PAGE_SIZE']
+    token = request.args.get('cursor')
+    if token is not None or current_app.config['FEED_PAGINATION'] == 'keyset':
+        return keyset_paginate(query, columns, count_key, token or None, per_page)
+    page = request.args.get('page', 1, type=int)
+    return query.paginate(per_page=per_page, page=page)
+
+
+class RankedPage:
+    # One numbered page over a precomputed list of post ids.
+
+    def __init__(self, items, page, total, per_page):
+        self.items = items
+        self.page = page
+        self.total = total
+        self.pages = max(1, -(-total // per_page))
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+
+_most_saved = (0.0, [])
+_most_saved_lock = threading.Lock()
+
+
+def most_saved_ids():
+    # The MOST_SAVED_SIZE public posts with the most saves, read off the
+    # save_count index and recomputed at most every MOST_SAVED_REFRESH
+    # seconds per process. One request refreshes; the rest keep the old list.
+    global _most_saved
+    expires, ids = _most_saved
+    now = time.monotonic()
+    if expires > now or not _most_saved_lock.acquire(blocking=not ids):
+        return ids
+    try:
+        if _most_saved[0] > now:
+            return _most_saved[1]
+        config = current_app.config
+        ids = db.session.scalars(
+            db.select(Post.id)
+            .where(Post.save_count > 0, Post.display == True, Post.private == False)
+            .order_by(Post.save_count.desc(), Post.id.desc())
+            .limit(config['MOST_SAVED_SIZE'])
+        ).all()
+        _most_saved = (now + config['MOST_SAVED_REFRESH'], ids)
+        return ids
+    finally:
+        _most_saved_lock.release()
+
+
+def most_saved_page(per_page=5):
+    ids = most_saved_ids()
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_ids = ids[(page - 1) * per_page:page * per_page]
+    posts = {post.id: post for post in
+             Post.query.options(selectinload(Post.author)).filter(Post.id.in_(page_ids))} if page_ids else {}
+    return RankedPage([posts[post_id] for post_id in page_ids if post_id in posts], page, len(ids), per_page)
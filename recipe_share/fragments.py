@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from flask import render_template, url_for
+from markupsafe import Markup
+
+# Rendered HTML for post cards and post pages, keyed by post id. Each entry
+# remembers the version it was rendered from (the post's updated_at plus the
+# author fields shown in it), so a stale entry is simply a miss. Per-user
+# parts such as the saved bookmark are filled into a placeholder after the
+# lookup. Entries live in a per-process LRU with a byte budget, optionally
+# backed by a shared store that every worker can read from.
+
+_BOOKMARK = '<!--bookmark-->'
+
+
+class LocalCache:
+    # Thread-safe LRU bounded by the total size of the cached HTML.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, version, html):
+        cost = len(html.encode('utf-8'))
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (version, html, cost)
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+
+class FileBackend:
+    # Shared tier kept as one file per entry in a directory. It lets several
+    # processes on one host share renders without running a cache server.
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key.replace(':', '-') + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._file(key), encoding='utf-8') as f:
+                return tuple(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set(self, key, version, html):
+        path = self._file(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump([version, html], f)
+        os.replace(tmp, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+
+class RedisBackend:
+
+    def __init__(self, url, ttl):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('FRAGMENT_CACHE_URL needs the redis package installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get('fragment:' + key)
+        return tuple(json.loads(value)) if value is not None else None
+
+    def set(self, key, version, html):
+        self.client.set('fragment:' + key, json.dumps([version, html]), ex=self.ttl or None)
+
+    def delete(self, key):
+        self.client.delete('fragment:' + key)
+
+
+def _backend(url, ttl):
+    if not url:
+        return None
+    scheme = urlsplit(url).scheme
+    if scheme == 'file':
+        return FileBackend(urlsplit(url).path)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisBackend(url, ttl)
+    raise RuntimeError(f'Unsupported FRAGMENT_CACHE_URL {url!r}')
+
+
+class FragmentCache:
+
+    def __init__(self):
+        self.local = LocalCache(0)
+        self.backend = None
+        self.enabled = True
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config['FRAGMENT_CACHE_ENABLED']
+        self.local = LocalCache(config['FRAGMENT_CACHE_MAX_BYTES'])
+        self.backend = _backend(config['FRAGMENT_CACHE_URL'], config['FRAGMENT_CACHE_TTL'])
+
+    def fetch(self, key, version, render):
+        if not self.enabled:
+            return render()
+        entry = self.local.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        if self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None and entry[0] == version:
+                self.shared_hits += 1
+                self.local.set(key, version, entry[1])
+                return entry[1]
+        self.misses += 1
+        html = render()
+        self.local.set(key, version, html)
+        if self.backend is not None:
+            self.backend.set(key, version, html)
+        return html
+
+    def invalidate(self, post_id):
+        for key in (f'card:{post_id}', f'page:{post_id}'):
+            self.local.delete(key)
+            if self.backend is not None:
+                self.backend.delete(key)
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'evictions': self.local.evictions,
+            'entries': len(self.local),
+            'bytes': self.local.size,
+            'max_bytes': self.local.max_bytes,
+        }
+
+
+fragment_cache = FragmentCache()
+
+
+def _version(post):
+    updated = post.updated_at or post.date_posted
+    return f'{updated.isoformat()}|{post.author.username}|{post.author.image_file}'
+
+
+def _bookmark(post_id, saved):
+    url = url_for('posts.save_post', post_id=post_id)
+    if saved:
+        return f'<a href="{url}" data-save-post="{post_id}" class="material-symbols-rounded bookmark-symbol-fill">bookmark</a>'
+    return f'<a href="{url}" data-save-post="{post_id}" class="material-symbols-outlined bookmark-symbol">bookmark</a>'
+
+
+def post_card(post, saved=False, bookmark=True):
+    html = fragment_cache.fetch(f'card:{post.id}', _version(post),
+                                lambda: render_template('_post_card.html', post=post, bookmark=Markup(_BOOKMARK)))
+    return Markup(html.replace(_BOOKMARK, _bookmark(post.id, saved) if bookmark else ''))
+
+
+def post_body(post):
+    return Markup(fragment_cache.fetch(f'page:{post.id}', _version(post),
+                                       lambda: render_template('_post_body.html', post=post)))
@@ -0,0 +1,103 @@
+import hashlib
+import os
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+
+# Conditional GET for the HTML pages, and far-future caching for static
+# files. Pages build their validators from cheap queries before rendering,
+# so a client that already has the current version gets a 304 without the
+# page query or template ever running. Static URLs carry a content hash
+# (?v=...) and so can be cached for a year.
+
+_fingerprints = {}
+_template_version = None
+
+
+def _file_hash(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _templates_version(app):
+    # Changes whenever a template does, so a deploy invalidates every ETag.
+    global _template_version
+    if _template_version is None:
+        digest = hashlib.md5()
+        for root, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+            for name in sorted(files):
+                digest.update(_file_hash(os.path.join(root, name)).encode())
+        _template_version = digest.hexdigest()[:12]
+    return _template_version
+
+
+def static_fingerprint(filename):
+    version = _fingerprints.get(filename)
+    if version is None:
+        path = os.path.join(current_app.static_folder, filename)
+        try:
+            version = _file_hash(path)
+        except OSError:
+            return None
+        if not current_app.debug:
+            _fingerprints[filename] = version
+    return version
+
+
+def _add_static_version(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = static_fingerprint(values['filename'])
+        if version:
+            values['v'] = version
+
+
+def _static_cache_headers(response):
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['STATIC_CACHE_MAX_AGE']
+        response.cache_control.immutable = True
+        response.expires = None
+    return response
+
+
+def init_app(app):
+    app.url_defaults(_add_static_version)
+    app.after_request(_static_cache_headers)
+
+
+def _page_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Pages differ for signed-in users, so shared caches must key on the
+    # session cookie and only anonymous copies may be stored publicly.
+    response.vary.add('Cookie')
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_page(validators, render, last_modified=None):
+    # `validators` identifies everything the page shows; `render` is only
+    # called when the client's copy is out of date.
+    parts = [_templates_version(current_app), current_user.get_id() or '-', request.full_path]
+    parts += [str(value) for value in validators]
+    etag = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+    # Pending flash messages make the page one-off.
+    if '_flashes' not in session:
+        if request.if_none_match:
+            fresh = request.if_none_match.contains(etag)
+        else:
+            fresh = (last_modified is not None and request.if_modified_since is not None
+                     and last_modified <= request.if_modified_since.replace(tzinfo=None))
+        if fresh:
+            return _page_headers(make_response('', 304), etag, last_modified)
+    return _page_headers(make_response(render()), etag, last_modified)
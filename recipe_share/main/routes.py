@@ -1,25 +1,36 @@
-from flask import render_template, request, Blueprint, flash, redirect, url_for
-from recipe_share.models import Post, SavePost
+from flask import render_template, Blueprint, flash, redirect, url_for, jsonify
+from recipe_share.feeds import public_feed, user_feed, saved_post_ids, paginate_feed, post_keyset, feed_version, most_saved_page
 from flask_login import current_user, login_required
+from recipe_share.fragments import fragment_cache
+from recipe_share.http_cache import conditional_page
+from recipe_share.database import read_replica
+from recipe_share.metrics import token_required
 
 main = Blueprint('main', __name__)
 
 @main.route("/")
 @main.route("/home")
+@read_replica
 def home():
-    saved_post_id = []
-    page = request.args.get('page', 1, type=int)
-    if current_user.is_authenticated:
-        saved_post_id = [post.post_id for post in SavePost.query.filter_by(user_id=current_user.id).all()]
-    posts = Post.query.order_by(Post.date_posted.desc()).filter_by(display=True).paginate(per_page=5, page=page)
-    return render_template('home.html', posts=posts, drop_title="All recipes", saved_post_id=saved_post_id)
+    saved_post_id = saved_post_ids()
+
+    def render():
+        posts = paginate_feed(public_feed(), post_keyset(), 'home')
+        return render_template('home.html', posts=posts, drop_title="All recipes", saved_post_id=saved_post_id)
+
+    return conditional_page([*feed_version(), sorted(saved_post_id)], render)
+
+@main.route("/most_saved")
+@read_replica
+def most_saved():
+    posts = most_saved_page()
+    return render_template('most_saved.html', posts=posts, drop_title="Most saved", saved_post_id=saved_post_ids())
 
 @main.route("/personal_home")
 @login_required
 def personal_home():
-    page = request.args.get('page', 1, type=int)
-    saved_post_id = [post.post_id for post in SavePost.query.filter_by(user_id=current_user.id).all()]
-    posts = Post.query.filter_by(author=current_user).filter_by(display=True).order_by(Post.date_posted.desc()).paginate(per_page=5 , page=page)
+    saved_post_id = saved_post_ids()
+    posts = paginate_feed(user_feed(current_user.id), post_keyset(), ('user', current_user.id))
     if posts:
         return render_template('personal_home.html', posts=posts, drop_title="Your recipes", saved_post_id=saved_post_id)
     else:
@@ -32,4 +43,9 @@ def personal_home():
 
 @main.route("/about")
 def about():
-    return render_template('about.html', title='About')
\ No newline at end of file
+    return render_template('about.html', title='About')
+
+@main.route("/stats/fragment-cache")
+@token_required
+def fragment_cache_stats():
+    return jsonify(fragment_cache.stats())
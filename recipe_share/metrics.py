@@ -0,0 +1,244 @@
+import cProfile
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from flask import current_app, g, has_request_context, request, Response, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# In-process request, SQL and scraper metrics, served in the Prometheus text
+# format at /metrics. Each observation is a perf_counter() call and a dict
+# update under a lock, cheap enough to leave on. Values are per process;
+# Prometheus scrapes every worker and sums them.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_label_text(self.labels, labels)} {value}'
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        # Per label set: [count per bucket..., +Inf count, sum].
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._values.items())
+        names = self.labels + ('le',)
+        for labels, series in items:
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                total += count
+                yield f'{self.name}_bucket{_label_text(names, labels + (bound,))} {total}'
+            yield f'{self.name}_sum{_label_text(self.labels, labels)} {series[-1]}'
+            yield f'{self.name}_count{_label_text(self.labels, labels)} {total}'
+
+
+class Gauges:
+    # Values read from a callback at scrape time, e.g. cache sizes.
+
+    def __init__(self, name, documentation, labels, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} gauge'
+        for labels, value in self.collect():
+            yield f'{self.name}{_label_text(self.labels, labels)} {value}'
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_latency = registry.register(Histogram(
+    'recipe_share_request_duration_seconds', 'Time spent handling a request.',
+    ('blueprint', 'endpoint', 'method', 'status')))
+request_queries = registry.register(Histogram(
+    'recipe_share_request_queries', 'SQL statements executed per request.',
+    ('blueprint', 'endpoint'), COUNT_BUCKETS))
+request_query_time = registry.register(Histogram(
+    'recipe_share_request_query_seconds', 'Time spent in SQL per request.',
+    ('blueprint', 'endpoint')))
+query_latency = registry.register(Histogram(
+    'recipe_share_sql_statement_duration_seconds', 'Time spent executing one SQL statement.',
+    ('statement',), QUERY_BUCKETS))
+fetch_latency = registry.register(Histogram(
+    'recipe_share_scraper_fetch_duration_seconds', 'Time spent fetching one page for the corpus.',
+    ('host', 'outcome')))
+
+
+def _cache_gauges():
+    from recipe_share.fragments import fragment_cache
+    from recipe_share.users import cache
+    from recipe_share.posts.corpus import corpus_searches
+    for name, value in fragment_cache.stats().items():
+        yield ('fragments', name), value
+    for name, value in corpus_searches.stats().items():
+        yield ('corpus_search', name), value
+    from recipe_share.posts.title_lookup import lookups
+    for prefix, ttl_cache in (('users', cache.users), ('saved_ids', cache.saved_ids), ('title_lookup', lookups)):
+        yield (prefix, 'hits'), ttl_cache.hits
+        yield (prefix, 'misses'), ttl_cache.misses
+
+
+registry.register(Gauges('recipe_share_cache', 'In-process cache counters and sizes.',
+                         ('cache', 'stat'), _cache_gauges))
+
+
+def _statement_kind(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, which goes away with the statement even when
+    # it raises and after_cursor_execute never runs.
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_query_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    query_latency.observe(elapsed, _statement_kind(statement))
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+        g.query_time += elapsed
+
+
+def _labels():
+    return request.blueprint or '', request.endpoint or 'unmatched'
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.query_count = 0
+    g.query_time = 0.0
+    if current_app.config['METRICS_PROFILE_SLOW_MS']:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _finish_request(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    blueprint, endpoint = _labels()
+    request_latency.observe(elapsed, blueprint, endpoint, request.method, response.status_code)
+    request_queries.observe(g.query_count, blueprint, endpoint)
+    request_query_time.observe(g.query_time, blueprint, endpoint)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed * 1000 >= current_app.config['METRICS_PROFILE_SLOW_MS']:
+            _dump_profile(profiler, endpoint, elapsed)
+    return response
+
+
+def _dump_profile(profiler, endpoint, elapsed):
+    directory = current_app.config['METRICS_PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{elapsed * 1000:.0f}ms.prof')
+    profiler.dump_stats(path)
+    current_app.logger.warning('Slow request %s %s took %.0f ms, profile in %s',
+                               request.method, request.full_path, elapsed * 1000, path)
+
+
+def token_required(view):
+    # For the operational endpoints (/metrics, /stats/...): with METRICS_TOKEN
+    # set, callers must send it as a bearer token.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config['METRICS_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@token_required
+def metrics_view():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    if app.config['METRICS_REQUIRE_TOKEN'] and not app.config['METRICS_TOKEN']:
+        raise RuntimeError('METRICS_TOKEN must be set; /metrics and /stats/fragment-cache '
+                           'would otherwise be public')
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
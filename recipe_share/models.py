@@ -2,12 +2,15 @@ from recipe_share import db, login_manager
 from flask import current_app 
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from recipe_share.users import cache
+    return cache.load_user(int(user_id))
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,6 +18,9 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     image_file = db.Column(db.String(20), nullable=False, default='default.jpg')
     password = db.Column(db.String(60), nullable=False)
+    # Feed pages show every author's name and picture, so their validators
+    # include the latest change to any user.
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     posts = db.relationship('Post', backref='author', lazy=True)
 
     def get_reset_token(self, expires_sec=1800):
@@ -33,33 +39,177 @@ class User(db.Model, UserMixin):
     def __repr__(self):
         return f"User('{self.username}', '{self.email}', '{self.image_file}')"
 
+def normalize_title(title):
+    return ' '.join(title.lower().split())
+
+
+def _title_key_default(context):
+    # Also covers Core inserts (imports, seeding) that bypass the validator.
+    return normalize_title(context.get_current_parameters()['title'])
+
+
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
+    # Lowercased, whitespace-collapsed title for exact-title search.
+    title_key = db.Column(db.String(100), index=True, default=_title_key_default)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     content = db.Column(db.Text, nullable=False)
     ingredients = db.Column(db.Text, nullable=False)
     private = db.Column(db.Boolean)
     display = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Number of SavePost rows for this post, kept in step by the listeners below.
+    save_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # The post's id in the file being imported; only set during an import.
+    import_id = db.Column(db.Integer, index=True)
+
+    __table_args__ = (
+        db.Index('ix_post_display_date_posted', 'display', 'date_posted'),
+        db.Index('ix_post_user_id_display_date_posted', 'user_id', 'display', 'date_posted'),
+        db.Index('ix_post_display_save_count', 'display', 'save_count', 'id'),
+        # For the latest change to one author's posts (feed_version).
+        db.Index('ix_post_user_id_updated_at', 'user_id', 'updated_at'),
+        db.Index('ix_post_user_id_id', 'user_id', 'id'),
+    )
+
+    @validates('title')
+    def _set_title_key(self, key, title):
+        self.title_key = normalize_title(title)
+        return title
 
     def __repr__(self):
         return f"Post('{self.title}', '{self.date_posted}')"
+
     
     
 class SavePost(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False, index=True)
+
+    __table_args__ = (
+        db.Index('uq_save_post_user_id_post_id', 'user_id', 'post_id', unique=True),
+    )
     
     def __repr__(self):
         return f"SavePost('{self.user_id}', '{self.post_id}')"
+
+
+def change_save_count(connection, post_id, delta):
+    # In the same transaction as the SavePost change. updated_at is set to
+    # itself so a save does not count as an edit of the post.
+    connection.execute(db.update(Post).where(Post.id == post_id)
+                       .values(save_count=Post.save_count + delta, updated_at=Post.updated_at))
+
+
+def add_save_counts(counts):
+    # For Core inserts and deletes of SavePost rows, which skip the listeners
+    # below: applies {post_id: change} in one executemany UPDATE.
+    table = Post.__table__
+    rows = [{'counted_post_id': post_id, 'delta': delta} for post_id, delta in counts.items() if delta]
+    if rows:
+        db.session.execute(
+            db.update(table).where(table.c.id == db.bindparam('counted_post_id'))
+            .values(save_count=table.c.save_count + db.bindparam('delta'), updated_at=table.c.updated_at),
+            rows)
+
+
+@event.listens_for(SavePost, 'after_insert')
+def _count_save(mapper, connection, target):
+    change_save_count(connection, target.post_id, 1)
+
+
+@event.listens_for(SavePost, 'after_delete')
+def _count_unsave(mapper, connection, target):
+    change_save_count(connection, target.post_id, -1)
+
+
+class DeletedPost(db.Model):
+    # A row per deleted post, so other processes (feed validators, the title
+    # index) can see deletes through an index instead of counting the posts.
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_deleted_post_user_id_id', 'user_id', 'id'),
+    )
+
+    def __repr__(self):
+        return f"DeletedPost('{self.post_id}', '{self.deleted_at}')"
+
+
+@event.listens_for(Post, 'after_delete')
+def _record_delete(mapper, connection, target):
+    connection.execute(db.insert(DeletedPost).values(post_id=target.id, user_id=target.user_id))
+
     
 class fromSearch(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
+    result_set = db.Column(db.String(32), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     title = db.Column(db.String, nullable=False)
     ingredients = db.Column(db.Text, nullable=False)
     content = db.Column(db.Text, nullable=False)
     already_saved = db.Column(db.Boolean, default=False)
+
+    __table_args__ = (
+        db.Index('ix_from_search_result_set_title', 'result_set', 'title'),
+    )
+
     def __repr__(self):
         return f"fromSearch('{self.title}', '{self.ingredients}', '{self.content}')"
+
+
+class MailOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(120), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)
+    message = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    sent_at = db.Column(db.DateTime)
+    failed = db.Column(db.Boolean, nullable=False, default=False)
+    last_error = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_pending', 'sent_at', 'failed', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f"MailOutbox('{self.recipients}', '{self.created_at}')"
+
+
+class ScrapedCollection(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(300), unique=True, nullable=False)
+    links = db.Column(db.Text, nullable=False)
+    etag = db.Column(db.String(200))
+    last_modified = db.Column(db.String(100))
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"ScrapedCollection('{self.url}', '{self.fetched_at}')"
+
+
+class ScrapedRecipe(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(300), unique=True, nullable=False)
+    title = db.Column(db.String, nullable=False)
+    ingredients = db.Column(db.Text, nullable=False)
+    method = db.Column(db.Text, nullable=False)
+    etag = db.Column(db.String(200))
+    last_modified = db.Column(db.String(100))
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # Set by the crawl batch that last changed the row; each batch gets the
+    # next number, so readers can ask for exactly what they have not seen.
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+
+    def __repr__(self):
+        return f"ScrapedRecipe('{self.title}', '{self.url}')"
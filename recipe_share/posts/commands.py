@@ -0,0 +1,52 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from recipe_share.models import User, Post
+from recipe_share.posts.transfer import iter_posts, iter_saves, iter_jsonl, import_jsonl
+
+
+@click.command('crawl')
+@click.option('--concurrency', type=int, help='Concurrent requests per host.')
+@click.option('--rate', type=float, help='Requests per second per host.')
+@click.option('--force', is_flag=True, help='Revalidate pages that are still inside the cache TTL.')
+@with_appcontext
+def crawl_command(concurrency, rate, force):
+    """Fetch the recipe collections into the local search corpus."""
+    # Only the crawler needs asyncio, aiohttp and BeautifulSoup.
+    import asyncio
+    from recipe_share.posts.scraper import HostLimiter, crawl
+    limiter = HostLimiter(
+        concurrency or current_app.config['SCRAPER_CONCURRENCY_PER_HOST'],
+        rate or current_app.config['SCRAPER_REQUESTS_PER_SECOND'],
+    )
+    stats = asyncio.run(crawl(limiter, force=force))
+    click.echo(f"Collections: {stats['collections']}, recipes: {stats['recipes']}, "
+               f"not modified: {stats['not_modified']}, failed: {stats['failed']}")
+
+
+@click.command('export-posts')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--user', 'username', help='Only export this user\'s posts.')
+@click.option('--saves/--no-saves', default=True, help='Include saved posts (whole-site exports only).')
+@with_appcontext
+def export_posts_command(output, username, saves):
+    """Write posts, then saved posts, to OUTPUT as JSON Lines."""
+    criteria = []
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'No user called {username}')
+        criteria.append(Post.user_id == user.id)
+    output.writelines(iter_jsonl(iter_posts(*criteria)))
+    if saves and not username:
+        output.writelines(iter_jsonl(iter_saves()))
+
+
+@click.command('import-posts')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+@with_appcontext
+def import_posts_command(source, batch_size):
+    """Add the posts and saved posts in a JSON Lines export to this database."""
+    stats = import_jsonl(source, batch_size)
+    click.echo(f"Posts: {stats['posts']}, saved posts: {stats['saves']}, skipped: {stats['skipped']}")
@@ -0,0 +1,64 @@
+import json
+from flask import current_app
+from sqlalchemy.orm import selectinload
+from recipe_share import db
+from recipe_share.coalesce import SingleFlight
+from recipe_share.models import ScrapedRecipe, Post
+from recipe_share.posts.ingredient_index import ingredient_index
+
+# Ingredient search over the crawled corpus and users' posts. Kept apart from
+# the scraper so that web workers never import aiohttp or BeautifulSoup.
+
+corpus_searches = SingleFlight()
+
+
+def score_recipe(ingredients, search_terms):
+    # The first ingredient matching a term scores 2, every further one 1.
+    matching_terms = set()
+    count = 0
+    terms = [s.replace('\r', '').lower() for s in search_terms]
+    for ingredient in ingredients:
+        ingredient = ingredient.lower()
+        for term in terms:
+            if term in ingredient:
+                count += 1 if term in matching_terms else 2
+                matching_terms.add(term)
+    return count
+
+
+def search_terms_key(search_terms):
+    return tuple(sorted({term.strip().lower() for term in search_terms} - {''}))
+
+
+def search_corpus(search_terms):
+    # Answers a search from the stored corpus only; run `flask crawl` to fill it.
+    # Returns (title, ingredients, method, score) for the best
+    # INGREDIENT_SEARCH_LIMIT recipes, best first. Identical searches running
+    # at the same time share one lookup; callers must not modify the list.
+    key = search_terms_key(search_terms)
+    return corpus_searches.do(key, _search_corpus, key)
+
+
+def _search_corpus(search_terms):
+    ranked = ingredient_index.recipes(search_terms, current_app.config['INGREDIENT_SEARCH_LIMIT'])
+    rows = {}
+    recipe_ids = [recipe_id for recipe_id, _ in ranked]
+    for i in range(0, len(recipe_ids), 500):
+        for recipe_id, title, ingredients, method in db.session.execute(
+                db.select(ScrapedRecipe.id, ScrapedRecipe.title, ScrapedRecipe.ingredients, ScrapedRecipe.method)
+                .where(ScrapedRecipe.id.in_(recipe_ids[i:i + 500]))):
+            rows[recipe_id] = (title, json.loads(ingredients), json.loads(method))
+    return [(*rows[recipe_id], score) for recipe_id, score in ranked if recipe_id in rows]
+
+
+def search_post_ingredients(search_terms, user_id=None):
+    # The best INGREDIENT_SEARCH_LIMIT posts for the same search, ranked the
+    # same way (score_recipe over Post.ingredients lines, then words shared
+    # with Post.content, then title), among those `user_id` may see.
+    ranked = ingredient_index.posts(search_terms_key(search_terms), user_id,
+                                    current_app.config['INGREDIENT_SEARCH_LIMIT'])
+    if not ranked:
+        return []
+    posts = {post.id: post for post in Post.query.options(selectinload(Post.author))
+             .filter(Post.id.in_([post_id for post_id, _ in ranked]))}
+    return [posts[post_id] for post_id, _ in ranked if post_id in posts]
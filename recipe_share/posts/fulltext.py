@@ -0,0 +1,94 @@
+import re
+from sqlalchemy import DDL, event, or_
+from sqlalchemy.orm import selectinload
+from recipe_share import db
+from recipe_share.models import Post
+
+# Full-text search over Post.title, Post.content and Post.ingredients.
+# SQLite keeps an external-content FTS5 table in step with `post` through
+# triggers; Postgres uses a generated tsvector column with a GIN index. Both
+# are created alongside the `post` table, and `flask create-indexes` adds them
+# to an existing database.
+
+_sqlite_ddl = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(
+        title, content, ingredients, content='post', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN
+        INSERT INTO post_fts(rowid, title, content, ingredients)
+        VALUES (new.id, new.title, new.content, new.ingredients);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, title, content, ingredients)
+        VALUES ('delete', old.id, old.title, old.content, old.ingredients);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF title, content, ingredients ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, title, content, ingredients)
+        VALUES ('delete', old.id, old.title, old.content, old.ingredients);
+        INSERT INTO post_fts(rowid, title, content, ingredients)
+        VALUES (new.id, new.title, new.content, new.ingredients);
+    END""",
+]
+
+_postgresql_ddl = [
+    """ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'C')) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_post_search_vector ON post USING gin (search_vector)",
+]
+
+for _statement in _sqlite_ddl:
+    event.listen(Post.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in _postgresql_ddl:
+    event.listen(Post.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+
+
+def setup_fulltext():
+    # Idempotent; also backfills the FTS5 table on an existing SQLite database.
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite':
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_fts'").first()
+            for statement in _sqlite_ddl:
+                conn.exec_driver_sql(statement)
+            if not exists:
+                conn.exec_driver_sql("INSERT INTO post_fts(post_fts) VALUES ('rebuild')")
+        elif dialect == 'postgresql':
+            for statement in _postgresql_ddl:
+                conn.exec_driver_sql(statement)
+    return dialect in ('sqlite', 'postgresql')
+
+
+def _fts5_query(text):
+    # Every word must match, as a prefix, anywhere in the indexed columns.
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_posts(text, user_id=None, page=1, per_page=5):
+    # Returns (posts, has_next) for one page of ranked results that the user
+    # is allowed to see.
+    visible = [Post.display == True, or_(Post.private == False, Post.user_id == user_id)]
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        match = _fts5_query(text)
+        if not match:
+            return [], False
+        fts = db.table('post_fts', db.column('rowid'))
+        query = (Post.query.join(fts, fts.c.rowid == Post.id)
+                 .filter(db.text('post_fts MATCH :match').bindparams(match=match), *visible)
+                 .order_by(db.text('bm25(post_fts, 10.0, 1.0, 4.0)'), Post.id.desc()))
+    elif dialect == 'postgresql':
+        tsquery = db.func.websearch_to_tsquery('english', text)
+        vector = db.literal_column('post.search_vector')
+        query = (Post.query.filter(vector.op('@@')(tsquery), *visible)
+                 .order_by(db.func.ts_rank_cd(vector, tsquery).desc(), Post.id.desc()))
+    else:
+        pattern = f'%{text}%'
+        query = (Post.query.filter(or_(Post.title.ilike(pattern), Post.ingredients.ilike(pattern),
+                                       Post.content.ilike(pattern)), *visible)
+                 .order_by(Post.date_posted.desc()))
+    rows = (query.options(selectinload(Post.author))
+            .offset((page - 1) * per_page).limit(per_page + 1).all())
+    return rows[:per_page], len(rows) > per_page
@@ -0,0 +1,348 @@
+import heapq
+import json
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from flask import current_app
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SIMPLE_TERM = re.compile(r"[a-z0-9]+")
+_MAX_LINE = 63
+_OVERFLOW = 1 << _MAX_LINE
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+class _Postings:
+    # Parallel compact arrays: document numbers (ascending) and a bitmask of
+    # the ingredient lines containing the token; lines past the 63rd share
+    # the top bit.
+    __slots__ = ('docs', 'lines')
+
+    def __init__(self):
+        self.docs = array('I')
+        self.lines = array('Q')
+
+
+class _Partition:
+    # One searchable collection (scraped recipes, or user posts) under dense
+    # document numbers. Besides the ingredient postings it keeps what ranking
+    # needs without a database round trip: each document's title, its owner
+    # (None when anyone may see it), its method words and its lowercased
+    # ingredient lines, which settle the rare terms the postings cannot.
+
+    def __init__(self):
+        self.postings = {}
+        self.method = {}
+        self.keys = array('I')
+        self.titles = []
+        self.owners = []
+        self.texts = []
+        self.doc_ids = {}
+        self.deleted = set()
+        self._vocabulary = None
+        self._expansions = {}
+
+    def insert(self, key, title, ingredients, method_words, owner=None):
+        if key in self.doc_ids:
+            self.delete(key)
+        doc = len(self.keys)
+        self.keys.append(key)
+        self.titles.append(title)
+        self.owners.append(owner)
+        self.doc_ids[key] = doc
+        lines = [ingredient.lower().replace('\n', '\r') for ingredient in ingredients]
+        # Search terms never contain '\r' or '\n', so neither can join a match
+        # across lines.
+        self.texts.append('\n'.join(lines))
+        masks = {}
+        for line, ingredient in enumerate(lines):
+            bit = 1 << min(line, _MAX_LINE)
+            for token in _TOKEN.findall(ingredient):
+                masks[token] = masks.get(token, 0) | bit
+        for token, mask in masks.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = _Postings()
+                self._vocabulary = None
+            postings.docs.append(doc)
+            postings.lines.append(mask)
+        for word in method_words:
+            docs = self.method.get(word)
+            if docs is None:
+                docs = self.method[word] = array('I')
+            docs.append(doc)
+
+    def delete(self, key):
+        doc = self.doc_ids.pop(key, None)
+        if doc is not None:
+            self.deleted.add(doc)
+            self.texts[doc] = ''
+            if len(self.deleted) > 1000 and len(self.deleted) > len(self.doc_ids):
+                self.compact()
+
+    def compact(self):
+        remap = {}
+        for doc in range(len(self.keys)):
+            if doc not in self.deleted:
+                remap[doc] = len(remap)
+        for token in list(self.postings):
+            old = self.postings[token]
+            new = _Postings()
+            for doc, mask in zip(old.docs, old.lines):
+                if doc in remap:
+                    new.docs.append(remap[doc])
+                    new.lines.append(mask)
+            if new.docs:
+                self.postings[token] = new
+            else:
+                del self.postings[token]
+        for word in list(self.method):
+            docs = array('I', (remap[doc] for doc in self.method[word] if doc in remap))
+            if docs:
+                self.method[word] = docs
+            else:
+                del self.method[word]
+        live = sorted(remap)
+        self.keys = array('I', (self.keys[doc] for doc in live))
+        self.titles = [self.titles[doc] for doc in live]
+        self.owners = [self.owners[doc] for doc in live]
+        self.texts = [self.texts[doc] for doc in live]
+        self.doc_ids = {key: doc for doc, key in enumerate(self.keys)}
+        self.deleted = set()
+        self._vocabulary = None
+
+    def expand(self, piece):
+        # The tokens containing `piece`, found with str.find over the whole
+        # vocabulary joined into one string and remembered until it grows.
+        if self._vocabulary is None:
+            words = sorted(self.postings)
+            starts = array('I')
+            offset = 0
+            for word in words:
+                starts.append(offset)
+                offset += len(word) + 1
+            self._vocabulary = ('\n'.join(words), words, starts)
+            self._expansions = {}
+        tokens = self._expansions.get(piece)
+        if tokens is None:
+            text, words, starts = self._vocabulary
+            tokens = []
+            at = text.find(piece)
+            while at != -1:
+                i = bisect_right(starts, at) - 1
+                tokens.append(words[i])
+                at = text.find(piece, starts[i] + len(words[i]) + 1)
+            if len(self._expansions) > 10000:
+                self._expansions = {}
+            self._expansions[piece] = tokens
+        return tokens
+
+    def piece_lines(self, piece):
+        # {doc: lines} for the lines with a token containing `piece`.
+        found = {}
+        get = found.get
+        for token in self.expand(piece):
+            postings = self.postings[token]
+            for doc, mask in zip(postings.docs, postings.lines):
+                found[doc] = get(doc, 0) | mask
+        return found
+
+    def _count(self, doc, term, mask):
+        # Lines of `doc` among `mask` that contain `term`, read from the text.
+        lines = self.texts[doc].split('\n')
+        count = 0
+        low = mask & (_OVERFLOW - 1)
+        while low:
+            bit = low & -low
+            if term in lines[bit.bit_length() - 1]:
+                count += 1
+            low ^= bit
+        if mask & _OVERFLOW:
+            count += sum(term in line for line in lines[_MAX_LINE:])
+        return count
+
+    def _postings_size(self, piece):
+        return sum(len(self.postings[token].docs) for token in self.expand(piece))
+
+    def term_counts(self, term):
+        # {doc: number of ingredient lines containing `term`}, as score_recipe
+        # counts them. A term that is one run of letters and digits is inside
+        # a line exactly when it is inside one of the line's tokens, so the
+        # OR of its tokens' line masks is the answer. Any other term is
+        # narrowed to the lines holding its rarest run, then checked.
+        if _SIMPLE_TERM.fullmatch(term):
+            counts = self.piece_lines(term)
+            for doc, mask in counts.items():
+                if mask & (mask - 1):
+                    counts[doc] = self._count(doc, term, mask) if mask & _OVERFLOW else _popcount(mask)
+                else:
+                    counts[doc] = 1
+            return counts
+        pieces = tokenize(term)
+        if pieces:
+            lines = self.piece_lines(min(pieces, key=self._postings_size))
+        else:
+            # Nothing to look up (e.g. "½"), so every line may match.
+            lines = dict.fromkeys(self.doc_ids.values(), (_OVERFLOW << 1) - 1)
+        counts = {}
+        texts = self.texts
+        for doc, mask in lines.items():
+            if term in texts[doc]:
+                count = self._count(doc, term, mask)
+                if count:
+                    counts[doc] = count
+        return counts
+
+    def rank(self, search_terms, limit, user_id=None):
+        # The best `limit` documents as (score, method overlap, title, key),
+        # ordered as the full scan with score_recipe orders them. Each term
+        # adds one for every line containing it and one more if there is any;
+        # a term given twice adds its lines again without the extra one.
+        occurrences = {}
+        for term in search_terms:
+            term = term.replace('\r', '').lower()
+            occurrences[term] = occurrences.get(term, 0) + 1
+        scores = {}
+        get = scores.get
+        for term, times in occurrences.items():
+            for doc, count in self.term_counts(term).items():
+                scores[doc] = get(doc, 0) + count * times + 1
+        deleted, owners, titles, keys = self.deleted, self.owners, self.titles, self.keys
+        eligible = [(score, doc) for doc, score in scores.items()
+                    if doc not in deleted and (owners[doc] is None or owners[doc] == user_id)]
+        if len(eligible) > limit:
+            # Only documents scoring at least the limit-th best can make it.
+            cutoff = heapq.nlargest(limit, eligible)[-1][0]
+            eligible = [entry for entry in eligible if entry[0] >= cutoff]
+        overlap = {doc: 0 for _, doc in eligible}
+        for word in set(search_terms):
+            for doc in self.method.get(word, ()):
+                if doc in overlap:
+                    overlap[doc] += 1
+        return heapq.nlargest(limit, ((score, overlap[doc], titles[doc], keys[doc]) for score, doc in eligible))
+
+
+def _method_words(text):
+    return set(text.lower().split())
+
+
+class IngredientIndex:
+    # Ingredient search over two partitions: the scraped corpus
+    # (ScrapedRecipe.id) and users' posts (Post.id). Terms match as plain
+    # substrings of a line, as in score_recipe: "tomato" finds "tomatoes",
+    # "chick" finds "chicken". Each term is expanded once to the vocabulary
+    # tokens containing it, and scores, method overlap and titles all come
+    # from the index, so only the rows that make the page are read.
+    #
+    # The crawler runs in its own process, so the corpus is brought up to
+    # date from ScrapedRecipe.revision on every search. Posts are refreshed
+    # like the title index, at most every INGREDIENT_INDEX_REFRESH seconds
+    # from post_state(), and only a post's own author sees it while private.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._recipes.doc_ids)
+
+    def _ensure_loaded(self):
+        self._load_recipes()
+        self._load_posts()
+
+    def _load_recipes(self):
+        from recipe_share import db
+        from recipe_share.models import ScrapedRecipe
+        with self._lock:
+            latest = db.session.scalar(db.select(db.func.max(ScrapedRecipe.revision)))
+            if latest is None or latest == self._revision:
+                return
+            query = db.select(ScrapedRecipe.id, ScrapedRecipe.title, ScrapedRecipe.ingredients,
+                              ScrapedRecipe.method, ScrapedRecipe.revision)
+            if self._revision is not None:
+                query = query.where(ScrapedRecipe.revision > self._revision)
+            seen = latest
+            for recipe_id, title, ingredients, method, revision in db.session.execute(query):
+                method_words = _method_words(' '.join(json.loads(method)))
+                self._recipes.insert(recipe_id, title, json.loads(ingredients), method_words)
+                seen = max(seen, revision)
+            self._revision = seen
+
+    def _insert_post(self, post_id, title, ingredients, content, private, display, user_id):
+        self._posts.delete(post_id)
+        if display:
+            self._posts.insert(post_id, title, ingredients.split('\n'), _method_words(content),
+                               None if private is False else user_id)
+
+    def _load_posts(self):
+        if self._posts_state is not None:
+            return
+        from recipe_share import db
+        from recipe_share.models import Post
+        from recipe_share.posts.post_changes import post_state
+        with self._lock:
+            if self._posts_state is not None:
+                return
+            # Taken first, so rows written during the load are read again.
+            state = post_state()
+            self._posts_checked_at = time.monotonic()
+            for row in db.session.execute(db.select(*self._post_columns()).where(Post.display == True)):
+                self._insert_post(*row)
+            self._posts_state = state
+
+    @staticmethod
+    def _post_columns():
+        from recipe_share.models import Post
+        return (Post.id, Post.title, Post.ingredients, Post.content, Post.private, Post.display, Post.user_id)
+
+    def _refresh_posts(self, interval):
+        if time.monotonic() - self._posts_checked_at < interval:
+            return
+        from recipe_share.posts.post_changes import post_state, changed_posts
+        with self._lock:
+            if time.monotonic() - self._posts_checked_at < interval:
+                return
+            self._posts_checked_at = time.monotonic()
+            state = post_state()
+            if state == self._posts_state:
+                return
+            deleted_ids, rows = changed_posts(self._posts_state, *self._post_columns())
+            for post_id in deleted_ids:
+                self._posts.delete(post_id)
+            for row in rows:
+                self._insert_post(*row)
+            self._posts_state = state
+
+    def clear(self):
+        with self._lock:
+            self._recipes = _Partition()
+            self._revision = None
+            self._posts = _Partition()
+            self._posts_state = None
+            self._posts_checked_at = 0.0
+
+    def recipes(self, search_terms, limit):
+        # [(ScrapedRecipe.id, score)] for the best `limit` matches, best first.
+        self._load_recipes()
+        with self._lock:
+            return [(key, score) for score, _, _, key in self._recipes.rank(search_terms, limit)]
+
+    def posts(self, search_terms, user_id, limit):
+        # [(Post.id, score)] for the best `limit` posts `user_id` may see.
+        self._load_posts()
+        self._refresh_posts(current_app.config['INGREDIENT_INDEX_REFRESH'])
+        with self._lock:
+            return [(key, score) for score, _, _, key in self._posts.rank(search_terms, limit, user_id)]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+from recipe_share import db
+from recipe_share.models import Post, DeletedPost
+
+# How the in-process post indexes (titles, ingredients) see writes made by
+# other processes. post_state() is three maxima answered from indexes: last
+# edit, newest id and last delete. When it differs from the state an index
+# last saw, changed_posts() returns what happened since then.
+
+# Rows changed this long before the last state are read again, for
+# transactions that committed after a later one was already seen.
+REREAD_WINDOW = timedelta(seconds=30)
+
+
+def post_state():
+    return tuple(db.session.execute(db.select(
+        db.select(db.func.max(Post.updated_at)).scalar_subquery(),
+        db.select(db.func.max(Post.id)).scalar_subquery(),
+        db.select(db.func.max(DeletedPost.deleted_at)).scalar_subquery())).one())
+
+
+def changed_posts(seen, *columns):
+    # (deleted post ids, rows of `columns` for posts edited or added) since
+    # the state `seen`. Apply the deletes first: SQLite may give a deleted
+    # post's id to a new post, which is then among the rows.
+    updated, max_id, deleted = seen
+    times = [at for at in (updated, deleted) if at is not None]
+    since = max(times) - REREAD_WINDOW if times else datetime.min
+    deleted_ids = db.session.scalars(db.select(DeletedPost.post_id).where(DeletedPost.deleted_at >= since)).all()
+    # New ids as well, for imported posts that keep an old updated_at.
+    rows = db.session.execute(db.select(*columns)
+                              .where(db.or_(Post.updated_at >= since, Post.id > (max_id or 0)))).all()
+    return deleted_ids, rows
@@ -1,14 +1,19 @@
 from flask import Blueprint
-from flask import render_template, request, Blueprint, flash, redirect, url_for, abort, session, jsonify
+from flask import render_template, request, Blueprint, flash, redirect, url_for, abort, session, jsonify, current_app
 from flask_login import current_user, login_required
 from recipe_share import db
-from recipe_share.models import Post, SavePost, fromSearch
+from recipe_share.models import Post, SavePost
 from recipe_share.posts.forms import PostForm, SearchForm
-from sqlalchemy import func
-import asyncio
-import aiohttp
-from concurrent.futures import ThreadPoolExecutor
-from bs4 import BeautifulSoup
+from recipe_share.feeds import saved_feed, saved_keyset, paginate_feed, saved_post_ids
+from recipe_share.posts.title_index import title_index
+from recipe_share.posts.title_lookup import find_post
+from recipe_share.posts.saves import apply_saves
+from recipe_share.fragments import fragment_cache
+from recipe_share.http_cache import conditional_page
+from recipe_share.database import read_replica
+from recipe_share.posts.corpus import search_corpus, search_post_ingredients
+from recipe_share.posts.fulltext import search_posts
+from recipe_share.posts.search_results import create_result_set, current_results, current_result_or_404
 import json
 import jinja2
 
@@ -18,11 +23,9 @@ posts = Blueprint('posts', __name__)
 @posts.route("/saved_posts")
 @login_required 
 def saved_posts():
-    page = request.args.get('page', 1, type=int)
-    posts = SavePost.query.filter_by(user_id=current_user.id).order_by(SavePost.id.desc()).paginate(per_page=5, page=page)
+    posts = paginate_feed(saved_feed(current_user.id), saved_keyset(), ('saved', current_user.id))
     if posts:
-        post = [Post.query.get_or_404(post.post_id) for post in posts.items]
-        return render_template('saved_posts.html', posts=post, drop_title="Saved recipes")
+        return render_template('saved_posts.html', posts=posts, drop_title="Saved recipes")
     else:
         flash("You haven't saved any posts!", "danger")
         return redirect(url_for('main_routes.home'))
@@ -50,6 +53,7 @@ def new_post():
         post.ingredients = ingredients
         db.session.add(post)
         db.session.commit()
+        title_index.add(post)
         flash('Post has been created', 'success')
         return redirect(url_for('main.home'))
     return render_template('create_post.html', title='New', form=form, legend='New Recipe')
@@ -58,7 +62,10 @@ def new_post():
 @posts.route("/post/<int:post_id>")
 def post(post_id): 
     post = Post.query.get_or_404(post_id)
-    return render_template('post.html', title=post.title, post=post)
+    last_modified = post.updated_at or post.date_posted
+    versions = [post.id, last_modified, post.author.username, post.author.image_file]
+    return conditional_page(versions, lambda: render_template('post.html', title=post.title, post=post),
+                            last_modified=last_modified)
 
 
 @posts.route("/post/<int:post_id>/update", methods=['GET', 'POST'])
@@ -80,6 +87,8 @@ def update_post(post_id):
         elif submit_type == 'public':
             post.private = False
         db.session.commit()
+        title_index.add(post)
+        fragment_cache.invalidate(post.id)
 
         flash('Post Updated', 'success')
         return redirect(url_for('posts.post', post_id=post.id))
@@ -104,6 +113,8 @@ def delete_post(post_id):
             db.session.delete(saved_post)
         db.session.delete(post)
     db.session.commit()
+    title_index.remove(post_id)
+    fragment_cache.invalidate(post_id)
     flash("Post Deleted", 'success')
     return redirect(url_for('main.home'))
 
@@ -111,43 +122,35 @@ def delete_post(post_id):
 @posts.route("/handle_search")
 def handle_search():
     query = request.args['search']
-    all_post_titles_public = [post.title for post in Post.query.filter_by(private=False).all()]
-    post = Post.query.filter(func.lower(Post.title) == func.lower(query)).first()
-    if post and query and post.private != True:  
-        flash(f'Found result for {post.title}', 'success')
-        return redirect(url_for('posts.post', post_id=post.id))
-    elif post and post.private == True:
-        if current_user == post.author:
-            flash(f'Found result for {post.title}', 'success')
-            return redirect(url_for('posts.post', post_id=post.id))
-        else:
-            flash(f'No result for {query}', 'danger')
-            return redirect(url_for('main.home'))
+    user_id = current_user.id if current_user.is_authenticated else None
+    found = find_post(query, user_id)
+    if found:
+        post_id, title = found
+        flash(f'Found result for {title}', 'success')
+        return redirect(url_for('posts.post', post_id=post_id))
     elif query:
-        flash(f'No result for {query}', 'danger')
+        return redirect(url_for('posts.search', q=query))
     else:
         flash('Please enter search query', 'danger')
-    return render_template('layout.html', post_titles = all_post_titles_public)
+    return render_template('layout.html')
+
+@posts.route("/search")
+@read_replica
+def search():
+    query = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    user_id = current_user.id if current_user.is_authenticated else None
+    results, has_next = search_posts(query, user_id=user_id, page=page)
+    if not results and page == 1:
+        flash(f'No result for {query}', 'danger')
+    return render_template('search_results.html', title='Search', posts=results, query=query, page=page,
+                           has_next=has_next, saved_post_id=saved_post_ids())
 
 @posts.route('/search_predictions')
 def search_predictions():
-    all_post_titles = [post.title for post in Post.query.all()]
-    query = request.args.get('query', '').lower()
-
-    if current_user.is_authenticated:
-        recipe_titles= [post.title for post in Post.query.filter_by(private=False).all()] + [post.title for post in Post.query.filter_by(author=current_user).all()]
-    else:
-        recipe_titles = [post.title for post in Post.query.filter_by(private=False).all()]
-
-    unique_predictions = set()
-
-    for title in recipe_titles:
-        if query in title.lower():
-            unique_predictions.add(title)
-
-    max_predictions = 5
-    predictions = list(unique_predictions)[:max_predictions]
-
+    query = request.args.get('query', '')
+    user_id = current_user.id if current_user.is_authenticated else None
+    predictions = title_index.predictions(query, user_id=user_id, limit=5)
     return jsonify(predictions)
 
 
@@ -162,6 +165,9 @@ def save_post(post_id):
         if post.display == False:
             db.session.delete(post)
         db.session.commit() 
+        if post.display == False:
+            title_index.remove(post_id)
+            fragment_cache.invalidate(post_id)
         return redirect(request.referrer)
     elif post.private == True and current_user != post.author:
         flash('This recipe is private', 'danger')
@@ -171,11 +177,35 @@ def save_post(post_id):
         db.session.commit()
         return redirect(request.referrer)
     
+@posts.route("/api/saves", methods=['POST'])
+@login_required
+def save_posts_batch():
+    # {"operations": [{"post_id": 1, "saved": true}, ...]}, later entries for
+    # the same post win. Only JSON is accepted, which a cross-site form
+    # cannot send. Returns each post's outcome and the full saved id list.
+    body = request.get_json(silent=True) if request.is_json else None
+    operations = body.get('operations') if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify(error='Expected a JSON body with a non-empty "operations" list'), 400
+    if len(operations) > current_app.config['SAVE_BATCH_MAX_OPERATIONS']:
+        return jsonify(error='Too many operations'), 400
+    wanted = {}
+    for operation in operations:
+        post_id = operation.get('post_id') if isinstance(operation, dict) else None
+        saved = operation.get('saved') if isinstance(operation, dict) else None
+        if type(post_id) is not int or type(saved) is not bool:
+            return jsonify(error='Each operation needs an integer "post_id" and a boolean "saved"'), 400
+        wanted[post_id] = saved
+    results = apply_saves(current_user.id, wanted)
+    return jsonify(results={str(post_id): result for post_id, result in results.items()},
+                   saved=list(saved_post_ids()))
+
+
 @posts.route("/search_ingredients/<title>", methods=['GET', 'POST'])
 @login_required
 def save_post_from_search(title):
     form=SearchForm()
-    recipe = fromSearch.query.filter_by(title=title).first()
+    recipe = current_result_or_404(title)
     content=recipe.content
     ingredients=recipe.ingredients
     ingredients = json.loads(ingredients)
@@ -183,6 +213,7 @@ def save_post_from_search(title):
     new_post = Post(title=title, content=content, ingredients=ingredients, author=current_user, display=False)
     db.session.add(new_post)    
     db.session.commit()
+    title_index.add(new_post)
     save_post = SavePost(user_id=current_user.id, post_id=new_post.id)
     db.session.add(save_post)
     db.session.commit()
@@ -190,7 +221,7 @@ def save_post_from_search(title):
     recipe.already_saved = True
     db.session.commit()
 
-    posts = fromSearch.query.all()
+    posts = current_results()
     return render_template('search_ingredients.html', posts=posts, form=form, searching=True)
 
 
@@ -206,130 +237,32 @@ def delete_post_from_search(title):
         db.session.delete(save_post)
         db.session.delete(post)
         db.session.commit()
+        title_index.remove(post.id)
+        fragment_cache.invalidate(post.id)
         
-    current_post = fromSearch.query.filter_by(title=title).first()
+    current_post = current_result_or_404(title)
     current_post.already_saved = False
     db.session.commit()
-    posts = fromSearch.query.all()
+    posts = current_results()
     return render_template('search_ingredients.html', posts=posts, form=form, searching=True)
 
 
-async def scrape_recipe(session, link, search_terms):
-    async with session.get(link) as response:
-        html = await response.text()
-        soup = BeautifulSoup(html, "html.parser")
-        results = soup.find(class_="layout-md-rail__primary")
-        recipe_elements = results.find_all("div", class_="card__section card__content")
-        links_list = [link["href"] for recipe_element in recipe_elements for link in recipe_element.find_all("a")]
-        links_list.pop(0)
-
-        # Use asyncio.gather to fetch recipe pages concurrently
-        tasks = [fetch_recipe_data(session, "https://www.bbcgoodfood.com" + link, search_terms) for link in links_list]
-        recipe_data_list = await asyncio.gather(*tasks)
-
-        return recipe_data_list
-
-async def fetch_recipe_data(session, recipe_url, search_terms):
-    async with session.get(recipe_url) as response:
-        html = await response.text()
-        soup = BeautifulSoup(html, "html.parser")
-        recipe_name = soup.find("h1").text.strip()
-        ingredients_and_recipe_section = soup.find("div", class_="row recipe__instructions")
-        ingredients_section = ingredients_and_recipe_section.find(class_="recipe__ingredients col-12 mt-md col-lg-6")
-        ingredients_list = ingredients_section.find_all("li")
-        ingredients = [ingredient.get_text() for ingredient in ingredients_list]
-
-        method_section = ingredients_and_recipe_section.find(class_="recipe__method-steps mb-lg col-12 col-lg-6")
-        method_list = method_section.find_all("li")
-        method = [method.get_text() for method in method_list]
-
-        matching_terms = []
-        non_unique_count = 0
-        unique_count = 0
-        search_terms = [s.replace('\r', '') for s in search_terms]
-        for ingredient in ingredients:
-            for term in search_terms:
-                if term.lower() in ingredient.lower():
-                    matching_terms.append(term.lower())
-                    if term.lower() in matching_terms[:-1]:
-                        non_unique_count += 1
-                    else:
-                        unique_count += 2
-                
-        print(unique_count, non_unique_count)
-        print("total", unique_count + non_unique_count)
-
-        
-        return recipe_name, ingredients, method, unique_count + non_unique_count
-
-
-
-
-async def get_ingredients_with_search(search_terms):
-    recipe_info = []
-    async with aiohttp.ClientSession() as session:
-        category_list = ["lunch", "dessert", "beef", "savoury-pie", "storecupboard-comfort-food",
-                         "sausage", "chicken", "autumn-vegetarian", "gravy"]
-        
-        tasks = []
-        for recipe_type in category_list:
-            tasks.append(scrape_recipe(session, "https://www.bbcgoodfood.com/recipes/collection/"+recipe_type.lower()+"-recipes", search_terms))
-        
-        results = await asyncio.gather(*tasks)
-        for matching_ingredient_results in results:
-            recipe_info.extend(matching_ingredient_results)
-    
-    return recipe_info
-
-
-
-
-
-
 @posts.route("/search_ingredients", methods=['GET', 'POST'])
 def search_ingredients():
     form = SearchForm()
-    currentPosts = fromSearch.query.all()
-    if currentPosts:
-        for post in currentPosts:
-            db.session.delete(post)
-            db.session.commit()
-
     if form.validate_on_submit():
         search_terms = form.ingredients.data.split('\n')
-        recipe_info = asyncio.run(get_ingredients_with_search(search_terms))
-        if not recipe_info:
+        recipe_info = search_corpus(search_terms)
+        user_id = current_user.id if current_user.is_authenticated else None
+        community = search_post_ingredients(search_terms, user_id)
+        if not recipe_info and not community:
             flash("No results found", "danger")
-            return render_template('search_ingredients.html', form=form, posts=recipe_dict, searching=False)
+            return render_template('search_ingredients.html', form=form, posts=[], searching=False)
 
-        # Create a list of tuples with all information
-        recipe_tuples = [(name, ing, meth, cnt) for name, ing, meth, cnt in recipe_info if cnt > 0]
-
-        # Sort the list based on the desired criteria
-        sorted_results = sorted(
-            recipe_tuples,
-            key=lambda x: (x[3], len(set(search_terms) & set(' '.join(x[2]).lower().split())), str(x[0])),
-            reverse=True
-        )
-
-        for recipe_name, ingredients, method, count in sorted_results:
-            method = ''.join(method).replace('[','').replace(']','').replace('\'','').replace('%25', '%')
-            ingredients = json.dumps(ingredients)
-            print(ingredients)
-            currentRecipes = fromSearch.query.filter_by(title=str(recipe_name)).first()
-            if not currentRecipes:
-                tempRecipes = fromSearch(title=str(recipe_name), ingredients=ingredients, content=str(method))
-                post = Post.query.filter_by(title=str(recipe_name)).first()
-                is_saved = False
-                if post:
-                    is_saved = SavePost.query.filter_by(user_id=current_user.id, post_id=post.id).first()
-                if is_saved:
-                    tempRecipes.already_saved = True
-                db.session.add(tempRecipes)
-
-        db.session.commit()
-        posts = fromSearch.query.all()
-        return render_template('search_ingredients.html', form=form, posts=posts)
+        create_result_set(recipe_info)
+        posts = current_results()
+        return render_template('search_ingredients.html', form=form, posts=posts, community=community,
+                               saved_post_id=saved_post_ids())
 
 
-    return render_template('search_ingredients.html', form=form, searching=False)
\ No newline at end of file
+    return render_template('search_ingredients.html', form=form, searching=False)
@@ -0,0 +1,81 @@
+from collections import Counter
+from sqlalchemy.dialects import postgresql, sqlite
+from recipe_share import db
+from recipe_share.fragments import fragment_cache
+from recipe_share.models import Post, SavePost, add_save_counts
+from recipe_share.posts.title_index import title_index
+from recipe_share.posts.title_lookup import lookups
+from recipe_share.users import cache
+
+# Batch save/unsave for the JSON API. Every post in the batch is resolved
+# together with the user's existing save in one IN query, then all inserts
+# and deletes go out in one transaction. Inserts skip rows that already
+# exist, so a save racing another request is harmless.
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _insert_saves(user_id, post_ids):
+    table = SavePost.__table__
+    rows = [{'user_id': user_id, 'post_id': post_id} for post_id in post_ids]
+    insert = _UPSERT_DIALECTS.get(db.engine.dialect.name)
+    if insert is None:
+        db.session.execute(db.insert(table), rows)
+        return post_ids
+    statement = (insert(table).values(rows)
+                 .on_conflict_do_nothing(index_elements=['user_id', 'post_id'])
+                 .returning(table.c.post_id))
+    return db.session.scalars(statement).all()
+
+
+def _delete_saves(user_id, post_ids):
+    table = SavePost.__table__
+    statement = db.delete(table).where(table.c.user_id == user_id, table.c.post_id.in_(post_ids))
+    if db.engine.dialect.delete_returning:
+        return db.session.scalars(statement.returning(table.c.post_id)).all()
+    db.session.execute(statement)
+    return post_ids
+
+
+def apply_saves(user_id, operations):
+    # `operations` maps post id -> True to save, False to unsave. Returns
+    # {post_id: 'saved' | 'unsaved' | 'unchanged' | 'forbidden' | 'not_found'}.
+    results = dict.fromkeys(operations, 'not_found')
+    rows = db.session.execute(
+        db.select(Post.id, Post.private, Post.display, Post.user_id, Post.title_key, SavePost.id)
+        .outerjoin(SavePost, (SavePost.post_id == Post.id) & (SavePost.user_id == user_id))
+        .where(Post.id.in_(operations))
+    ).all()
+    to_save, to_unsave, hidden = [], [], {}
+    for post_id, private, display, author_id, title_key, save_id in rows:
+        if operations[post_id] == (save_id is not None):
+            results[post_id] = 'unchanged'
+        elif operations[post_id]:
+            if private and author_id != user_id:
+                results[post_id] = 'forbidden'
+            else:
+                to_save.append(post_id)
+        else:
+            to_unsave.append(post_id)
+            # Posts kept from an ingredient search only exist while saved.
+            if display == False and author_id == user_id:
+                hidden[post_id] = title_key
+
+    changes = Counter()
+    if to_save:
+        changes.update(_insert_saves(user_id, to_save))
+    if to_unsave:
+        changes.subtract(_delete_saves(user_id, to_unsave))
+    add_save_counts(changes)
+    if hidden:
+        db.session.execute(db.delete(Post.__table__).where(Post.__table__.c.id.in_(hidden)))
+    db.session.commit()
+
+    cache.invalidate(user_id)
+    for post_id, title_key in hidden.items():
+        title_index.remove(post_id)
+        fragment_cache.invalidate(post_id)
+        lookups.delete(title_key)
+    results.update(dict.fromkeys(to_save, 'saved'))
+    results.update(dict.fromkeys(to_unsave, 'unsaved'))
+    return results
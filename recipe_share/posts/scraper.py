@@ -0,0 +1,283 @@
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
+from flask import current_app
+from recipe_share import db
+from recipe_share.metrics import fetch_latency
+from recipe_share.models import ScrapedCollection, ScrapedRecipe
+
+
+category_list = ["lunch", "dessert", "beef", "savoury-pie", "storecupboard-comfort-food",
+                 "sausage", "chicken", "autumn-vegetarian", "gravy"]
+
+
+def collection_urls():
+    base_url = current_app.config['SCRAPER_BASE_URL']
+    return [base_url + "/recipes/collection/" + recipe_type.lower() + "-recipes" for recipe_type in category_list]
+
+
+# lxml is several times faster than the pure-Python parser; use it when installed.
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+def _classes(attrs):
+    value = (attrs or {}).get("class") or ()
+    return value.split() if isinstance(value, str) else value
+
+
+class SectionStrainer(SoupStrainer):
+    # Only builds tags that `wanted(name, classes)` accepts, and everything
+    # inside them; the rest of the page is tokenized and thrown away.
+
+    def __init__(self, wanted):
+        super().__init__()
+        self.wanted = wanted
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        # bs4 >= 4.13
+        return self.wanted(name, _classes(attrs))
+
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        # bs4 < 4.13
+        return markup_name if self.wanted(markup_name, _classes(markup_attrs)) else None
+
+
+_COLLECTION_SECTIONS = SectionStrainer(lambda name, classes: "layout-md-rail__primary" in classes)
+_RECIPE_SECTIONS = SectionStrainer(
+    lambda name, classes: name == "h1" or (name == "div" and "recipe__instructions" in classes))
+
+
+def parse_collection(html):
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=_COLLECTION_SECTIONS)
+    results = soup.find(class_="layout-md-rail__primary")
+    recipe_elements = results.find_all("div", class_="card__section card__content")
+    links_list = [link["href"] for recipe_element in recipe_elements for link in recipe_element.find_all("a")]
+    links_list.pop(0)
+    return links_list
+
+
+def parse_recipe(html):
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=_RECIPE_SECTIONS)
+    recipe_name = soup.find("h1").text.strip()
+    ingredients_and_recipe_section = soup.find("div", class_="row recipe__instructions")
+    ingredients_section = ingredients_and_recipe_section.find(class_="recipe__ingredients col-12 mt-md col-lg-6")
+    ingredients = [ingredient.get_text() for ingredient in ingredients_section.find_all("li")]
+
+    method_section = ingredients_and_recipe_section.find(class_="recipe__method-steps mb-lg col-12 col-lg-6")
+    method = [method.get_text() for method in method_section.find_all("li")]
+    return recipe_name, ingredients, method
+
+
+def _is_fresh(row, now):
+    ttl = timedelta(seconds=current_app.config['SCRAPER_CACHE_TTL'])
+    return row is not None and row.fetched_at + ttl > now
+
+
+def _conditional_headers(row):
+    headers = {}
+    if row is not None:
+        if row.etag:
+            headers['If-None-Match'] = row.etag
+        if row.last_modified:
+            headers['If-Modified-Since'] = row.last_modified
+    return headers
+
+
+class _HostState:
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+        self.next_request = 0.0
+
+
+class HostLimiter:
+    # Caps concurrent requests and the request rate separately for each host.
+
+    def __init__(self, concurrency, requests_per_second):
+        self.concurrency = concurrency
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self._hosts = {}
+
+    @asynccontextmanager
+    async def limit(self, url):
+        host = urlsplit(url).netloc
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.concurrency)
+        async with state.semaphore:
+            async with state.lock:
+                loop = asyncio.get_running_loop()
+                wait = state.next_request - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                state.next_request = max(loop.time(), state.next_request) + self.interval
+            yield
+
+
+async def fetch_page(session, limiter, url, row=None):
+    # Returns (status, html, etag, last_modified); html is None on a 304.
+    async with limiter.limit(url):
+        # Timed from after the rate limiter lets the request through.
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            async with session.get(url, headers=_conditional_headers(row)) as response:
+                outcome = str(response.status)
+                if response.status == 304:
+                    return 304, None, row.etag, row.last_modified
+                response.raise_for_status()
+                html = await response.text()
+                return response.status, html, response.headers.get('ETag'), response.headers.get('Last-Modified')
+        finally:
+            fetch_latency.observe(time.perf_counter() - start, urlsplit(url).netloc, outcome)
+
+
+def _store(model, rows, url, result, now, **fields):
+    status, _, etag, last_modified = result
+    row = rows.get(url)
+    if row is None:
+        row = model(url=url)
+        db.session.add(row)
+        rows[url] = row
+    if status != 304:
+        for name, value in fields.items():
+            setattr(row, name, value)
+    row.etag = etag
+    row.last_modified = last_modified
+    row.fetched_at = now
+
+
+class ScraperClient:
+    # One aiohttp session for a whole crawl: keep-alive connections pooled
+    # up to max_connections (and the limiter's concurrency per host), cached
+    # DNS, timeouts and retries with backoff for transient failures. Pages
+    # are parsed off the event loop, in a thread or a process pool.
+
+    def __init__(self, limiter, max_connections=100, timeout=30, connect_timeout=10,
+                 retries=2, retry_backoff=0.5, dns_cache_ttl=300, parse_workers=0):
+        self.limiter = limiter
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.dns_cache_ttl = dns_cache_ttl
+        self.parse_workers = parse_workers
+        self.session = None
+        self._parse_pool = None
+
+    @classmethod
+    def from_config(cls, limiter, config):
+        return cls(limiter,
+                   max_connections=config['SCRAPER_MAX_CONNECTIONS'],
+                   timeout=config['SCRAPER_TIMEOUT'],
+                   connect_timeout=config['SCRAPER_CONNECT_TIMEOUT'],
+                   retries=config['SCRAPER_RETRIES'],
+                   retry_backoff=config['SCRAPER_RETRY_BACKOFF'],
+                   dns_cache_ttl=config['SCRAPER_DNS_CACHE_TTL'],
+                   parse_workers=config['SCRAPER_PARSE_WORKERS'])
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                         limit_per_host=self.limiter.concurrency,
+                                         ttl_dns_cache=self.dns_cache_ttl)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        if self.parse_workers:
+            self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown()
+
+    def _retryable(self, error):
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+    async def fetch(self, url, row=None):
+        for attempt in range(self.retries + 1):
+            try:
+                return await fetch_page(self.session, self.limiter, url, row)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries or not self._retryable(e):
+                    raise
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def parse(self, parse, html):
+        # A pool of None is the loop's default thread pool.
+        return await asyncio.get_running_loop().run_in_executor(self._parse_pool, parse, html)
+
+
+async def _fetch_parsed(client, url, row, parse):
+    try:
+        result = await client.fetch(url, row)
+        parsed = await client.parse(parse, result[1]) if result[1] is not None else None
+    except (aiohttp.ClientError, asyncio.TimeoutError, AttributeError, IndexError) as e:
+        current_app.logger.warning('Skipping %s: %r', url, e)
+        return url, None, None
+    return url, result, parsed
+
+
+async def scrape_recipe(client, link, collections):
+    return await _fetch_parsed(client, link, collections.get(link), parse_collection)
+
+
+async def fetch_recipe_data(client, recipe_url, recipes):
+    return await _fetch_parsed(client, recipe_url, recipes.get(recipe_url), parse_recipe)
+
+
+async def crawl(limiter, force=False, batch_size=20):
+    # Refreshes the stored corpus. Pages still inside SCRAPER_CACHE_TTL are
+    # skipped unless forced, stale ones are revalidated with ETag and
+    # Last-Modified, and recipes are committed in batches as they arrive.
+    now = datetime.utcnow()
+    base_url = current_app.config['SCRAPER_BASE_URL']
+    collections = {row.url: row for row in ScrapedCollection.query.all()}
+    recipes = {row.url: row for row in ScrapedRecipe.query.all()}
+    stats = {'collections': 0, 'recipes': 0, 'not_modified': 0, 'failed': 0}
+
+    async with ScraperClient.from_config(limiter, current_app.config) as client:
+        stale_collections = [url for url in collection_urls() if force or not _is_fresh(collections.get(url), now)]
+        for url, result, links in await asyncio.gather(
+                *[scrape_recipe(client, url, collections) for url in stale_collections]):
+            if result is None:
+                stats['failed'] += 1
+                continue
+            _store(ScrapedCollection, collections, url, result, now, links=json.dumps(links))
+            stats['collections'] += 1
+        db.session.commit()
+
+        recipe_urls = list(dict.fromkeys(
+            base_url + link for url in collection_urls() if url in collections
+            for link in json.loads(collections[url].links)
+        ))
+        stale_recipes = [url for url in recipe_urls if force or not _is_fresh(recipes.get(url), now)]
+        revision = (db.session.scalar(db.select(db.func.max(ScrapedRecipe.revision))) or 0) + 1
+        tasks = [fetch_recipe_data(client, url, recipes) for url in stale_recipes]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            url, result, parsed = await task
+            if result is None:
+                stats['failed'] += 1
+            elif parsed is None:
+                _store(ScrapedRecipe, recipes, url, result, now)
+                stats['not_modified'] += 1
+            else:
+                title, ingredients, method = parsed
+                _store(ScrapedRecipe, recipes, url, result, now, revision=revision,
+                       title=title, ingredients=json.dumps(ingredients), method=json.dumps(method))
+                stats['recipes'] += 1
+            if done % batch_size == 0:
+                db.session.commit()
+                revision += 1
+        db.session.commit()
+    return stats
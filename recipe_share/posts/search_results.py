@@ -0,0 +1,84 @@
+import json
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, session
+from flask_login import current_user
+from recipe_share import db
+from recipe_share.models import Post, SavePost, fromSearch
+
+
+_cleanup_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+def saved_titles(user_id, titles):
+    # Titles (out of `titles`) that the user already has a saved post for.
+    found = set()
+    titles = list(titles)
+    for i in range(0, len(titles), 500):
+        found.update(db.session.scalars(
+            db.select(Post.title)
+            .join(SavePost, SavePost.post_id == Post.id)
+            .where(SavePost.user_id == user_id, Post.title.in_(titles[i:i + 500]))
+        ))
+    return found
+
+
+def create_result_set(recipe_info):
+    # Stores one search's results under a fresh id kept in the user's session.
+    result_set = secrets.token_hex(16)
+    user_id = current_user.id if current_user.is_authenticated else None
+    titles = list(dict.fromkeys(str(recipe_name) for recipe_name, _, _, _ in recipe_info))
+    already_saved = saved_titles(user_id, titles) if user_id is not None else set()
+
+    rows = []
+    seen = set()
+    now = datetime.utcnow()
+    for recipe_name, ingredients, method, count in recipe_info:
+        title = str(recipe_name)
+        if title in seen:
+            continue
+        seen.add(title)
+        method = ''.join(method).replace('[','').replace(']','').replace('\'','').replace('%25', '%')
+        rows.append(dict(result_set=result_set, user_id=user_id, created_at=now, title=title,
+                         ingredients=json.dumps(ingredients), content=str(method),
+                         already_saved=title in already_saved))
+    if rows:
+        db.session.execute(db.insert(fromSearch), rows)
+    db.session.commit()
+    session['result_set'] = result_set
+    schedule_cleanup()
+    return result_set
+
+
+def current_results():
+    result_set = session.get('result_set')
+    if result_set is None:
+        return []
+    return fromSearch.query.filter_by(result_set=result_set).order_by(fromSearch.id).all()
+
+
+def current_result_or_404(title):
+    return fromSearch.query.filter_by(result_set=session.get('result_set'), title=title).first_or_404()
+
+
+def delete_expired(app):
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=app.config['SEARCH_RESULTS_TTL'])
+        db.session.execute(db.delete(fromSearch).where(fromSearch.created_at < cutoff))
+        db.session.commit()
+
+
+def schedule_cleanup():
+    # Expired result sets are removed in bulk from a background thread, at most
+    # once per SEARCH_RESULTS_CLEANUP_INTERVAL in each process.
+    global _last_cleanup
+    app = current_app._get_current_object()
+    with _cleanup_lock:
+        now = time.monotonic()
+        if now - _last_cleanup < app.config['SEARCH_RESULTS_CLEANUP_INTERVAL']:
+            return
+        _last_cleanup = now
+    threading.Thread(target=delete_expired, args=(app,), daemon=True).start()
@@ -0,0 +1,233 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import current_app
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _TitleBucket:
+    # Distinct titles visible to one audience (the public, or a single owner).
+    # Titles are ranked by where the query matches: start of title, start of a
+    # later word, then anywhere (trigram lookup, queries of 3+ characters only).
+
+    def __init__(self):
+        self.counts = {}
+        self.prefixes = []
+        self.word_prefixes = []
+        self.trigrams = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, title, keep_sorted=True):
+        if title in self.counts:
+            self.counts[title] += 1
+            return
+        self.counts[title] = 1
+        key = _normalize(title)
+        place = insort if keep_sorted else list.append
+        place(self.prefixes, (key, title))
+        for suffix in self._word_suffixes(key):
+            place(self.word_prefixes, (suffix, key, title))
+        for gram in _trigrams(key):
+            place(self.trigrams.setdefault(gram, []), (key, title))
+
+    def sort(self):
+        self.prefixes.sort()
+        self.word_prefixes.sort()
+        for postings in self.trigrams.values():
+            postings.sort()
+
+    def remove(self, title):
+        count = self.counts.get(title)
+        if count is None:
+            return
+        if count > 1:
+            self.counts[title] = count - 1
+            return
+        del self.counts[title]
+        key = _normalize(title)
+        self._discard(self.prefixes, (key, title))
+        for suffix in self._word_suffixes(key):
+            self._discard(self.word_prefixes, (suffix, key, title))
+        for gram in _trigrams(key):
+            postings = self.trigrams.get(gram)
+            if postings is not None:
+                self._discard(postings, (key, title))
+                if not postings:
+                    del self.trigrams[gram]
+
+    def matches(self, query, limit):
+        # Returns up to `limit` (tier, key, title) tuples, best first.
+        found = []
+        seen = set()
+        for key, title in self._scan(self.prefixes, query, limit):
+            found.append((0, key, title))
+            seen.add(title)
+        if len(found) < limit:
+            for key, title in self._scan(self.word_prefixes, query, limit + len(seen)):
+                if title not in seen:
+                    found.append((1, key, title))
+                    seen.add(title)
+                    if len(found) == limit:
+                        break
+        if len(found) < limit and len(query) >= 3:
+            # Walk the shortest posting list in key order; a substring check
+            # implies every other trigram is present, so no intersection needed.
+            postings = min((self.trigrams.get(gram, ()) for gram in _trigrams(query)), key=len)
+            for key, title in postings:
+                if title not in seen and query in key:
+                    found.append((2, key, title))
+                    if len(found) == limit:
+                        break
+        return found
+
+    @staticmethod
+    def _scan(entries, query, limit):
+        start = bisect_left(entries, (query,))
+        for entry in entries[start:start + limit]:
+            if not entry[0].startswith(query):
+                break
+            yield entry[-2:]
+
+    @staticmethod
+    def _word_suffixes(key):
+        return [key[i + 1:] for i, char in enumerate(key) if char == ' ' and key[i + 1:]]
+
+    @staticmethod
+    def _discard(entries, entry):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+
+class TitleIndex:
+    # Process-local index of Post titles for search_predictions. Public titles
+    # share one bucket, private titles get a bucket per owner so they are only
+    # ever offered to the user who wrote them. Built from the database on
+    # first use and kept current by the post routes after each commit. Writes
+    # from other processes are picked up at most every TITLE_INDEX_REFRESH
+    # seconds: three indexed maxima (last edit, newest id, last delete) tell
+    # whether anything changed, and only the posts edited or deleted since
+    # then, plus any new ids, are read and applied. Predictions themselves
+    # never touch the database.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._posts = {}
+        self._public = _TitleBucket()
+        self._private = {}
+        self._state_seen = None
+        self._checked_at = 0.0
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from recipe_share import db
+        from recipe_share.models import Post
+        from recipe_share.posts.post_changes import post_state
+        with self._lock:
+            if self._loaded:
+                return
+            # Taken first, so rows written during the load are read again.
+            self._state_seen = post_state()
+            self._checked_at = time.monotonic()
+            rows = db.session.execute(db.select(Post.id, Post.title, Post.private, Post.user_id))
+            for post_id, title, private, user_id in rows:
+                self._insert(post_id, title, private, user_id, keep_sorted=False)
+            self._public.sort()
+            for bucket in self._private.values():
+                bucket.sort()
+            self._loaded = True
+
+    def _refresh(self, interval):
+        if time.monotonic() - self._checked_at < interval:
+            return
+        from recipe_share.models import Post
+        from recipe_share.posts.post_changes import post_state, changed_posts
+        with self._lock:
+            if time.monotonic() - self._checked_at < interval:
+                return
+            self._checked_at = time.monotonic()
+            state = post_state()
+            if state == self._state_seen:
+                return
+            deleted_ids, rows = changed_posts(self._state_seen, Post.id, Post.title, Post.private, Post.user_id)
+            for post_id in deleted_ids:
+                self._delete(post_id)
+            for post_id, title, private, user_id in rows:
+                self._delete(post_id)
+                self._insert(post_id, title, private, user_id)
+            self._state_seen = state
+
+    def _bucket(self, private, user_id, create=False):
+        if private is False:
+            return self._public
+        if create:
+            return self._private.setdefault(user_id, _TitleBucket())
+        return self._private.get(user_id)
+
+    def _insert(self, post_id, title, private, user_id, keep_sorted=True):
+        self._posts[post_id] = (title, private, user_id)
+        self._bucket(private, user_id, create=True).add(title, keep_sorted)
+
+    def _delete(self, post_id):
+        entry = self._posts.pop(post_id, None)
+        if entry is None:
+            return
+        title, private, user_id = entry
+        bucket = self._bucket(private, user_id)
+        if bucket is not None:
+            bucket.remove(title)
+            if bucket is not self._public and not len(bucket):
+                del self._private[user_id]
+
+    def add(self, post):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._delete(post.id)
+            self._insert(post.id, post.title, post.private, post.user_id)
+
+    def remove(self, post_id):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._delete(post_id)
+
+    def clear(self):
+        with self._lock:
+            self._posts.clear()
+            self._public = _TitleBucket()
+            self._private.clear()
+            self._loaded = False
+
+    def predictions(self, query, user_id=None, limit=5):
+        query = _normalize(query)
+        if not query:
+            return []
+        self._ensure_loaded()
+        self._refresh(current_app.config['TITLE_INDEX_REFRESH'])
+        with self._lock:
+            found = self._public.matches(query, limit)
+            own = self._private.get(user_id) if user_id is not None else None
+            if own is not None:
+                found += own.matches(query, limit)
+        predictions = []
+        for _, _, title in sorted(set(found)):
+            if title not in predictions:
+                predictions.append(title)
+            if len(predictions) == limit:
+                break
+        return predictions
+
+
+title_index = TitleIndex()
@@ -0,0 +1,66 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from recipe_share import db
+from recipe_share.coalesce import SingleFlight
+from recipe_share.models import Post, normalize_title
+from recipe_share.users.cache import TTLCache
+
+# Exact-title lookups for the search box. Each normalized title is looked up
+# once on the indexed Post.title_key column and the answer is cached, misses
+# included, for TITLE_LOOKUP_TTL seconds. The cached answer covers every
+# audience: the post the public sees, plus any private post per owner.
+# Identical lookups in flight share one query. A committed change to a
+# post's title drops the entries for its old and new titles; the TTL bounds
+# how long other processes lag behind.
+
+lookups = TTLCache('TITLE_LOOKUP_TTL', 'TITLE_LOOKUP_MAX_ENTRIES')
+_flights = SingleFlight()
+
+
+def _lookup(key):
+    public = None
+    private = {}
+    rows = db.session.execute(
+        db.select(Post.id, Post.title, Post.private, Post.user_id)
+        .where(Post.title_key == key).order_by(Post.id))
+    for post_id, title, is_private, user_id in rows:
+        if not is_private:
+            public = public or (post_id, title)
+        else:
+            private.setdefault(user_id, (post_id, title))
+    return public, private
+
+
+def find_post(query, user_id=None):
+    # Returns (post_id, title) of the post with this title that `user_id`
+    # (None when signed out) may see, their own private one first, or None.
+    key = normalize_title(query)
+    if not key:
+        return None
+    found = lookups.get(key)
+    if found is None:
+        found = _flights.do(key, _lookup, key)
+        lookups.set(key, found)
+    public, private = found
+    return private.get(user_id) or public
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_titles(session, flush_context):
+    changed = session.info.setdefault('changed_titles', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Post):
+            history = db.inspect(obj).attrs.title_key.history
+            # Any change counts: visibility moves a post between audiences.
+            changed.update(key for key in (obj.title_key, *history.deleted) if key)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_titles(session):
+    for key in session.info.pop('changed_titles', ()):
+        lookups.delete(key)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_titles(session, previous_transaction):
+    session.info.pop('changed_titles', None)
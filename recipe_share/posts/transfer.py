@@ -0,0 +1,143 @@
+import json
+from collections import Counter
+from datetime import datetime
+from recipe_share import db
+from recipe_share.models import User, Post, SavePost, add_save_counts
+
+# Streams posts and saved posts to and from JSON Lines. Rows are read with
+# yield_per and written with batched executemany inserts, so memory stays
+# flat whatever the size of the file. Records name their author by username
+# and refer to posts by the id they had in the exported database; import
+# gives posts new ids and remaps the saved posts that point at them. The old
+# id is kept in Post.import_id while the import runs, so the remapping is a
+# lookup per batch of saves rather than a map of every post in the file.
+
+_POST_COLUMNS = (Post.id, Post.title, Post.date_posted, Post.updated_at, Post.content,
+                 Post.ingredients, Post.private, Post.display, User.username)
+
+
+def _post_record(row):
+    post_id, title, date_posted, updated_at, content, ingredients, private, display, username = row
+    return {'type': 'post', 'id': post_id, 'author': username, 'title': title,
+            'date_posted': date_posted.isoformat(),
+            'updated_at': updated_at.isoformat() if updated_at else None,
+            'content': content, 'ingredients': ingredients.split('\n'),
+            'private': bool(private), 'display': bool(display)}
+
+
+def iter_posts(*criteria, batch_size=1000):
+    query = (db.select(*_POST_COLUMNS).join(User, User.id == Post.user_id)
+             .where(*criteria).order_by(Post.id)
+             .execution_options(yield_per=batch_size))
+    for row in db.session.execute(query):
+        yield _post_record(row)
+
+
+def iter_saves(batch_size=1000):
+    query = (db.select(SavePost.post_id, User.username).join(User, User.id == SavePost.user_id)
+             .order_by(SavePost.id).execution_options(yield_per=batch_size))
+    for post_id, username in db.session.execute(query):
+        yield {'type': 'save', 'user': username, 'post_id': post_id}
+
+
+def iter_jsonl(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+class Importer:
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.user_ids = {}
+        self.posts = []
+        self.saves = []
+        self.stats = {'posts': 0, 'saves': 0, 'skipped': 0}
+
+    def _user_id(self, username):
+        if username not in self.user_ids:
+            self.user_ids[username] = db.session.scalar(db.select(User.id).where(User.username == username))
+        return self.user_ids[username]
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind == 'post':
+            user_id = self._user_id(record['author'])
+            if user_id is None:
+                self.stats['skipped'] += 1
+                return
+            date_posted = datetime.fromisoformat(record['date_posted'])
+            updated_at = record.get('updated_at')
+            self.posts.append({
+                'import_id': record.get('id'), 'title': record['title'], 'content': record['content'],
+                'ingredients': '\n'.join(record['ingredients']),
+                'private': record.get('private', False), 'display': record.get('display', True),
+                'date_posted': date_posted,
+                'updated_at': datetime.fromisoformat(updated_at) if updated_at else date_posted,
+                'user_id': user_id,
+            })
+            if len(self.posts) >= self.batch_size:
+                self.flush_posts()
+        elif kind == 'save':
+            self.saves.append(record)
+            if len(self.saves) >= self.batch_size:
+                self.flush_saves()
+        else:
+            self.stats['skipped'] += 1
+
+    def flush_posts(self):
+        if not self.posts:
+            return
+        db.session.execute(db.insert(Post), self.posts)
+        self.stats['posts'] += len(self.posts)
+        self.posts = []
+        db.session.commit()
+
+    def _post_ids(self, old_ids):
+        return dict(db.session.execute(
+            db.select(Post.import_id, Post.id).where(Post.import_id.in_(old_ids))).all())
+
+    def flush_saves(self):
+        # Saved posts may refer to posts still waiting in the post batch.
+        self.flush_posts()
+        if not self.saves:
+            return
+        post_ids = self._post_ids({record['post_id'] for record in self.saves})
+        rows = set()
+        for record in self.saves:
+            user_id = self._user_id(record['user'])
+            post_id = post_ids.get(record['post_id'])
+            if user_id is None or post_id is None:
+                self.stats['skipped'] += 1
+            else:
+                rows.add((user_id, post_id))
+        if rows:
+            db.session.execute(db.insert(SavePost), [{'user_id': u, 'post_id': p} for u, p in rows])
+            add_save_counts(Counter(p for _, p in rows))
+            db.session.commit()
+        self.stats['saves'] += len(rows)
+        self.saves = []
+
+    def finish(self):
+        self.flush_posts()
+        self.flush_saves()
+        clear_import_ids()
+        return self.stats
+
+
+def clear_import_ids():
+    # Old ids mean nothing once their saves are in, and would clash with the
+    # next import's. updated_at is kept so feeds and ETags don't change.
+    db.session.execute(db.update(Post).where(Post.import_id.is_not(None))
+                       .values(import_id=None, updated_at=Post.updated_at))
+    db.session.commit()
+
+
+def import_jsonl(lines, batch_size=1000):
+    # Clears what an interrupted import may have left behind first.
+    clear_import_ids()
+    importer = Importer(batch_size)
+    for line in lines:
+        if line.strip():
+            importer.add(json.loads(line))
+    return importer.finish()
@@ -0,0 +1,95 @@
+import os
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.exc import SQLAlchemyError
+from recipe_share import db
+
+# Getting a worker ready before its first request. Compiled templates are
+# kept in a bytecode cache on disk (filled at build time with `flask
+# compile-templates`, or on first use), and with WARM_UP_ON_START the app
+# compiles every template, opens its DB pool and loads the in-process
+# indexes inside create_app. Under gunicorn with preload_app that happens
+# once in the master and the workers inherit it; each worker then only
+# replaces the inherited DB connections with its own (see gunicorn.conf.py).
+
+
+def _private_dir(directory):
+    # Jinja unmarshals and runs whatever it finds in the cache, so a directory
+    # someone else could write to is refused.
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    stat = os.stat(directory)
+    if hasattr(os, 'getuid') and (stat.st_uid != os.getuid() or stat.st_mode & 0o022):
+        raise RuntimeError(f'TEMPLATE_CACHE_DIR {directory} must be owned by this user and not '
+                           f'writable by others')
+    return directory
+
+
+def init_app(app):
+    # With no TEMPLATE_CACHE_DIR, Jinja picks a private per-user directory.
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory:
+        directory = _private_dir(directory)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.cli.add_command(compile_templates_command)
+    if app.config['WARM_UP_ON_START']:
+        warm_up(app)
+
+
+def compile_templates(app):
+    # Loads every template once, which writes its bytecode to the cache.
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_pool(engine):
+    # Checks out as many connections as the pool keeps, then returns them.
+    size = engine.pool.size() if hasattr(engine.pool, 'size') else 1
+    connections = []
+    try:
+        for _ in range(size):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warm_up(app):
+    from recipe_share import feeds
+    from recipe_share.posts.ingredient_index import ingredient_index
+    from recipe_share.posts.title_index import title_index
+    compile_templates(app)
+    with app.app_context():
+        try:
+            for engine in db.engines.values():
+                warm_pool(engine)
+            title_index._ensure_loaded()
+            ingredient_index._ensure_loaded()
+            feeds.most_saved_ids()
+        except SQLAlchemyError as e:
+            # e.g. before `flask create-indexes` has made the tables; the
+            # first requests load the same things on demand.
+            app.logger.warning('Skipped DB warm-up: %s', e)
+        finally:
+            db.session.remove()
+
+
+def after_fork(app):
+    # A forked worker must not share the parent's sockets. close=False leaves
+    # them to the parent and gives this process a fresh pool.
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+            if app.config['WARM_UP_ON_START']:
+                warm_pool(engine)
+
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    """Fill the template bytecode cache, e.g. while building a release."""
+    count = compile_templates(current_app)
+    click.echo(f'Compiled {count} templates into {current_app.jinja_env.bytecode_cache.directory}.')
@@ -0,0 +1,47 @@
+// Bookmark clicks save and unsave in place. Clicks are collected for a
+// moment and sent to /api/saves as one batch; the response's saved ids then
+// set every bookmark on the page. Without this script the links still work.
+(function () {
+  const pending = new Map();
+  let timer = null;
+
+  function show(link, saved) {
+    link.classList.toggle("material-symbols-rounded", saved);
+    link.classList.toggle("bookmark-symbol-fill", saved);
+    link.classList.toggle("material-symbols-outlined", !saved);
+    link.classList.toggle("bookmark-symbol", !saved);
+  }
+
+  function render(saved) {
+    const ids = new Set(saved.map(String));
+    document.querySelectorAll("a[data-save-post]").forEach((link) => show(link, ids.has(link.dataset.savePost)));
+  }
+
+  function flush() {
+    timer = null;
+    const operations = Array.from(pending, ([postId, saved]) => ({ post_id: Number(postId), saved: saved }));
+    pending.clear();
+    fetch(document.body.dataset.savesUrl, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      credentials: "same-origin",
+      body: JSON.stringify({ operations: operations }),
+    })
+      .then((response) => (response.ok ? response.json() : Promise.reject(response)))
+      .then((data) => render(data.saved))
+      .catch(() => window.location.reload());
+  }
+
+  document.addEventListener("click", (event) => {
+    const link = event.target.closest("a[data-save-post]");
+    if (!link || !document.body.dataset.savesUrl) {
+      return;
+    }
+    event.preventDefault();
+    const saved = !link.classList.contains("bookmark-symbol-fill");
+    pending.set(link.dataset.savePost, saved);
+    document.querySelectorAll(`a[data-save-post="${link.dataset.savePost}"]`).forEach((other) => show(other, saved));
+    clearTimeout(timer);
+    timer = setTimeout(flush, 300);
+  });
+})();
@@ -0,0 +1,127 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from recipe_share import db
+from recipe_share.database import from_replica
+from recipe_share.models import User, SavePost
+
+# Per-process, short-lived cache of the signed-in user's row and saved post
+# ids, so an authenticated page view does not re-read either. Any committed
+# change to a User or SavePost row drops that user's entries; the TTL bounds
+# how long another process's copy can lag behind.
+
+
+class SavedIds:
+    # Sorted post ids in a compact int array, with `in` by binary search.
+    __slots__ = ('_ids',)
+
+    def __init__(self, ids=()):
+        self._ids = array('I', sorted(ids))
+
+    def __contains__(self, post_id):
+        i = bisect_left(self._ids, post_id)
+        return i < len(self._ids) and self._ids[i] == post_id
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class TTLCache:
+
+    def __init__(self, ttl_setting='USER_CACHE_TTL', size_setting='USER_CACHE_MAX_ENTRIES'):
+        self.ttl_setting = ttl_setting
+        self.size_setting = size_setting
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if from_replica():
+            return
+        config = current_app.config
+        with self._lock:
+            self._entries[key] = (time.monotonic() + config[self.ttl_setting], value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > config[self.size_setting]:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+users = TTLCache()
+saved_ids = TTLCache()
+
+_columns = [column.key for column in User.__table__.columns]
+
+
+def load_user(user_id):
+    row = users.get(user_id)
+    if row is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            users.set(user_id, {key: getattr(user, key) for key in _columns})
+        return user
+    # Attach a copy to this request's session without a SELECT, so routes
+    # can still change and commit current_user as usual.
+    user = User(**row)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def saved_post_ids(user_id):
+    ids = saved_ids.get(user_id)
+    if ids is None:
+        ids = SavedIds(db.session.scalars(db.select(SavePost.post_id).where(SavePost.user_id == user_id)))
+        saved_ids.set(user_id, ids)
+    return ids
+
+
+def invalidate(user_id):
+    users.delete(user_id)
+    saved_ids.delete(user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    changed = session.info.setdefault('changed_users', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+        elif isinstance(obj, SavePost):
+            changed.add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_changed(session):
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changes(session, previous_transaction):
+    session.info.pop('changed_users', None)
@@ -0,0 +1,186 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from PIL import Image, ImageOps, UnidentifiedImageError
+from flask import current_app, abort, url_for
+from recipe_share import db
+from recipe_share.models import User
+
+# Profile pictures are decoded and resized in a process pool after the
+# request has returned. Each upload is written once per size in IMAGE_SIZES,
+# as WebP and JPEG, named after a hash of the uploaded bytes so the files
+# never change and can be cached forever. User.image_file holds the hash;
+# older values with an extension are single files from before this.
+
+_FORMATS = (('WEBP', 'webp'), ('JPEG', 'jpg'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+
+def picture_dir():
+    return os.path.join(current_app.root_path, 'static/profile_pics')
+
+
+def _limit_memory(limit_mb):
+    if limit_mb:
+        try:
+            import resource
+        except ImportError:
+            return
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _render(data, directory, name, sizes, max_pixels):
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(BytesIO(data)) as image:
+        largest = max(sizes)
+        # JPEGs decode straight to the smallest scale (1/2 .. 1/8) that is
+        # still at least as big as the largest output.
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        # Each size is reduced from the previous one rather than the original.
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size), reducing_gap=2.0)
+            for image_format, ext in _FORMATS:
+                path = os.path.join(directory, f'{name}-{size}.{ext}')
+                image.save(path + '.tmp', image_format, quality=85)
+                os.replace(path + '.tmp', path)
+
+
+def _executor():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = current_app.config
+                if _slots is None:
+                    _slots = threading.BoundedSemaphore(config['IMAGE_MAX_PENDING'])
+                _pool = ProcessPoolExecutor(max_workers=config['IMAGE_WORKERS'],
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_limit_memory,
+                                            initargs=(config['IMAGE_WORKER_MEMORY_MB'],))
+    return _pool
+
+
+def picture_files(name):
+    if '.' in name:
+        return [name]
+    return [f'{name}-{size}.{ext}' for size in current_app.config['IMAGE_SIZES'] for _, ext in _FORMATS]
+
+
+def _remove_picture(name):
+    if name == 'default.jpg' or User.query.filter_by(image_file=name).first():
+        return
+    for filename in picture_files(name):
+        try:
+            os.remove(os.path.join(picture_dir(), filename))
+        except FileNotFoundError:
+            pass
+
+
+def _finish(app, user_id, name, error=None):
+    with app.app_context():
+        try:
+            if error is not None:
+                app.logger.warning('Could not process picture for user %s: %r', user_id, error)
+                _remove_picture(name)
+                return
+            user = db.session.get(User, user_id)
+            if user is None:
+                return
+            old = user.image_file
+            user.image_file = name
+            db.session.commit()
+            if old != name:
+                _remove_picture(old)
+        finally:
+            db.session.remove()
+
+
+def check_picture(form_picture):
+    # Reads only the header; returns an error message or None.
+    try:
+        with Image.open(form_picture) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        # Pillow refuses headers far beyond its own pixel limit.
+        return 'That image is too large, please upload a smaller one.'
+    except (UnidentifiedImageError, OSError):
+        return 'That file is not an image we can read.'
+    finally:
+        form_picture.seek(0)
+    if width * height > current_app.config['IMAGE_MAX_PIXELS']:
+        return 'That image is too large, please upload a smaller one.'
+    return None
+
+
+def save_picture(form_picture, user):
+    # Queues the upload; user.image_file changes once every size is written.
+    data = form_picture.read()
+    user_id = user.id
+    name = hashlib.sha256(data).hexdigest()[:16]
+    config = current_app.config
+    args = (data, picture_dir(), name, config['IMAGE_SIZES'], config['IMAGE_MAX_PIXELS'])
+    app = current_app._get_current_object()
+    if all(os.path.exists(os.path.join(picture_dir(), f)) for f in picture_files(name)):
+        _finish(app, user_id, name)
+        return
+    if not config['IMAGE_WORKERS']:
+        try:
+            _render(*args)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            _finish(app, user_id, name, e)
+        else:
+            _finish(app, user_id, name)
+        return
+    pool = _executor()
+    if not _slots.acquire(timeout=config['IMAGE_QUEUE_TIMEOUT']):
+        abort(503)
+    future = pool.submit(_render, *args)
+
+    def done(future):
+        _slots.release()
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A worker died, e.g. on the memory limit; start a fresh pool next time.
+            _discard(pool)
+        _finish(app, user_id, name, error)
+
+    future.add_done_callback(done)
+
+
+def avatar_url(user, size, ext='webp'):
+    # Smallest stored size covering `size`; legacy pictures have one file.
+    if '.' in user.image_file:
+        return url_for('static', filename='profile_pics/' + user.image_file)
+    sizes = sorted(current_app.config['IMAGE_SIZES'])
+    size = next((s for s in sizes if s >= size), sizes[-1])
+    return url_for('users.picture', filename=f'{user.image_file}-{size}.{ext}')
+
+
+def _discard(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,183 @@
+import json
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_mail import Connection, sanitize_address, sanitize_addresses
+from recipe_share import db
+from recipe_share.models import MailOutbox
+
+# Outgoing mail is written to the mail_outbox table inside the request and
+# delivered later by a sender that keeps one SMTP connection open across
+# batches. The sender runs either as a daemon thread in each web process
+# (MAIL_OUTBOX_WORKER = 'thread') or as `flask mail-worker` on its own.
+# In thread mode each process starts its sender on its first request, which
+# under gunicorn is after the fork, so mail queued before a restart still
+# goes out. Delivered rows hold reset links, so they are deleted once they
+# are MAIL_OUTBOX_RETENTION seconds old.
+
+_wakeup = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+_PURGE_INTERVAL = 60
+
+
+def queue_message(msg):
+    msg.date = msg.date or time.time()
+    db.session.add(MailOutbox(
+        sender=sanitize_address(msg.sender),
+        recipients=json.dumps(list(sanitize_addresses(msg.send_to))),
+        message=msg.as_bytes(),
+    ))
+    db.session.commit()
+    if current_app.config['MAIL_OUTBOX_WORKER'] == 'thread':
+        _ensure_thread(current_app._get_current_object())
+        _wakeup.set()
+
+
+class SMTPSession:
+    # Holds one SMTP connection open between batches, reconnecting when the
+    # server has dropped it.
+
+    def __init__(self):
+        self.host = None
+
+    def get(self):
+        if self.host is not None:
+            try:
+                self.host.noop()
+            except (smtplib.SMTPException, OSError):
+                self.host = None
+        if self.host is None:
+            self.host = Connection(current_app.extensions['mail']).configure_host()
+        return self.host
+
+    def close(self):
+        if self.host is not None:
+            try:
+                self.host.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.host = None
+
+
+def _claim_batch(now):
+    config = current_app.config
+    candidates = db.session.scalars(
+        db.select(MailOutbox.id)
+        .where(MailOutbox.sent_at.is_(None), MailOutbox.failed == False,
+               MailOutbox.next_attempt_at <= now,
+               db.or_(MailOutbox.locked_until.is_(None), MailOutbox.locked_until < now))
+        .order_by(MailOutbox.next_attempt_at)
+        .limit(config['MAIL_OUTBOX_BATCH_SIZE'])
+    ).all()
+    claimed = []
+    lock_until = now + timedelta(seconds=config['MAIL_OUTBOX_LOCK_TIMEOUT'])
+    for outbox_id in candidates:
+        # Only one sender can win each row, even with several processes.
+        result = db.session.execute(
+            db.update(MailOutbox)
+            .where(MailOutbox.id == outbox_id,
+                   db.or_(MailOutbox.locked_until.is_(None), MailOutbox.locked_until < now))
+            .values(locked_until=lock_until)
+        )
+        if result.rowcount:
+            claimed.append(outbox_id)
+    db.session.commit()
+    return [db.session.get(MailOutbox, outbox_id) for outbox_id in claimed]
+
+
+def deliver_pending(smtp):
+    # Sends one batch of due messages; returns how many were sent.
+    config = current_app.config
+    now = datetime.utcnow()
+    batch = _claim_batch(now)
+    sent = 0
+    for item in batch:
+        try:
+            if not current_app.extensions['mail'].suppress:
+                smtp.get().sendmail(item.sender, json.loads(item.recipients), item.message)
+        except (smtplib.SMTPException, OSError) as e:
+            smtp.close()
+            item.attempts += 1
+            item.last_error = repr(e)
+            if item.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+                item.failed = True
+                current_app.logger.error('Giving up on mail %s: %r', item.id, e)
+            else:
+                delay = config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (item.attempts - 1)
+                item.next_attempt_at = now + timedelta(seconds=delay)
+        else:
+            item.sent_at = now
+            sent += 1
+        item.locked_until = None
+    db.session.commit()
+    return sent
+
+
+def purge_delivered(now):
+    # Deletes sent messages, and those given up on, past the retention period.
+    cutoff = now - timedelta(seconds=current_app.config['MAIL_OUTBOX_RETENTION'])
+    result = db.session.execute(
+        db.delete(MailOutbox)
+        .where(db.or_(MailOutbox.sent_at < cutoff,
+                      db.and_(MailOutbox.failed == True, MailOutbox.created_at < cutoff)))
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def run_sender(app, stop=None):
+    smtp = SMTPSession()
+    with app.app_context():
+        interval = app.config['MAIL_OUTBOX_POLL_INTERVAL']
+        next_purge = 0
+        while stop is None or not stop.is_set():
+            try:
+                if time.monotonic() >= next_purge:
+                    purge_delivered(datetime.utcnow())
+                    next_purge = time.monotonic() + _PURGE_INTERVAL
+                sent = deliver_pending(smtp)
+            except Exception:
+                app.logger.exception('Mail outbox sender failed')
+                db.session.rollback()
+                sent = 0
+            finally:
+                db.session.remove()
+            if not sent:
+                # Idle: drop the connection after a quiet poll, wake early on new mail.
+                if not _wakeup.wait(interval):
+                    smtp.close()
+                _wakeup.clear()
+        smtp.close()
+
+
+def _ensure_thread(app):
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=run_sender, args=(app,), name='mail-outbox', daemon=True)
+            _thread.start()
+
+
+def _start_sender():
+    # Cheap once the thread is up; a forked worker does not inherit the
+    # parent's thread, so it starts its own here.
+    if _thread is None or not _thread.is_alive():
+        _ensure_thread(current_app._get_current_object())
+
+
+def init_app(app):
+    if app.config['MAIL_OUTBOX_WORKER'] == 'thread':
+        app.before_request(_start_sender)
+    app.cli.add_command(mail_worker_command)
+
+
+@click.command('mail-worker')
+@with_appcontext
+def mail_worker_command():
+    """Deliver queued mail until interrupted."""
+    run_sender(current_app._get_current_object())
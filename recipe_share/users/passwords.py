@@ -0,0 +1,70 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt as _bcrypt
+from flask import current_app, abort
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = None
+
+
+def _hash(password, rounds):
+    return _bcrypt.hashpw(password.encode('utf-8'), _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(pw_hash, password):
+    return _bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+
+
+def _executor():
+    # One pool per process, created on first use so forked workers each get
+    # their own. BCRYPT_MAX_PENDING bounds the jobs queued or running.
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = current_app.config
+                _slots = threading.BoundedSemaphore(config['BCRYPT_MAX_PENDING'])
+                _pool = ProcessPoolExecutor(max_workers=config['BCRYPT_WORKERS'],
+                                            mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _run(fn, *args):
+    if not current_app.config['BCRYPT_WORKERS']:
+        return fn(*args)
+    pool = _executor()
+    if not _slots.acquire(timeout=current_app.config['BCRYPT_QUEUE_TIMEOUT']):
+        # Shed load instead of queueing without limit behind a login storm.
+        abort(503)
+    try:
+        return pool.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    return _run(_hash, password, current_app.config['BCRYPT_LOG_ROUNDS'])
+
+
+def check_password(pw_hash, password):
+    return _run(_check, pw_hash, password)
+
+
+def needs_rehash(pw_hash):
+    # bcrypt hashes look like $2b$12$..., where 12 is the work factor.
+    try:
+        rounds = int(pw_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != current_app.config['BCRYPT_LOG_ROUNDS']
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
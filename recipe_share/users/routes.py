@@ -1,11 +1,16 @@
 from flask import Blueprint
-from flask import render_template, request, Blueprint, flash, redirect, url_for
-from recipe_share.models import Post, SavePost
+from flask import render_template, request, Blueprint, flash, redirect, url_for, send_from_directory, current_app, Response, stream_with_context
+from recipe_share.feeds import user_feed, saved_post_ids, paginate_feed, post_keyset, feed_version
+from recipe_share.http_cache import conditional_page
+from recipe_share.database import read_replica
+from recipe_share.posts.transfer import iter_posts, iter_jsonl
 from flask_login import current_user, login_required, login_user, logout_user
-from recipe_share import db, bcrypt
+from recipe_share import db
 from recipe_share.users.forms import RegistrationForm, LoginForm, UpdateAccountForm, RequestResetForm, ResetPasswordForm
-from recipe_share.users.utils import save_picture, send_reset_email
-from recipe_share.models import User
+from recipe_share.users.utils import send_reset_email
+from recipe_share.users.images import check_picture, save_picture, picture_dir
+from recipe_share.users.passwords import hash_password, check_password, needs_rehash
+from recipe_share.models import User, Post
 
 users = Blueprint('users', __name__)
 
@@ -15,7 +20,7 @@ def register():
         return redirect(url_for('main.home'))
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = hash_password(form.password.data)
         user = User(username=form.username.data, email=form.email.data, password=hashed_password)
         db.session.add(user)
         db.session.commit()
@@ -31,7 +36,10 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and check_password(user.password, form.password.data):
+            if needs_rehash(user.password):
+                user.password = hash_password(form.password.data)
+                db.session.commit()
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             if next_page:
@@ -52,27 +60,52 @@ def logout():
 def account():
     form = UpdateAccountForm()
     if form.validate_on_submit():
-        if form.picture.data:
-            picture_filename = save_picture(form_picture=form.picture.data)
-            current_user.image_file = picture_filename
+        picture_error = check_picture(form.picture.data) if form.picture.data else None
+        if picture_error:
+            flash(picture_error, 'danger')
+            return redirect(url_for('users.account'))
         current_user.username = form.username.data
         current_user.email = form.email.data
         db.session.commit()
+        if form.picture.data:
+            save_picture(form.picture.data, current_user)
         flash('Account Updated', 'success')
         return redirect(url_for('users.account'))
     elif request.method == 'GET':
         form.username.data = current_user.username
         form.email.data = current_user.email
-    image_file = url_for('static', filename='profile_pics/' + current_user.image_file)
-    return render_template('account.html', title='Account', image_file=image_file, form=form)
+    return render_template('account.html', title='Account', form=form)
+
+@users.route("/pictures/<path:filename>")
+def picture(filename):
+    # Content-hashed, so the file behind a name never changes.
+    response = send_from_directory(picture_dir(), filename,
+                                   max_age=current_app.config['IMAGE_CACHE_MAX_AGE'])
+    response.cache_control.immutable = True
+    return response
 
 @users.route("/user/<string:username>")
+@read_replica
 def user_posts(username):
-    page = request.args.get('page', 1, type=int)
-    saved_post_id = [post.post_id for post in SavePost.query.filter_by(user_id=current_user.id).all()]
+    saved_post_id = saved_post_ids()
+    user = User.query.filter_by(username=username).first_or_404()
+
+    def render():
+        posts = paginate_feed(user_feed(user.id), post_keyset(), ('user', user.id))
+        return render_template('user_posts.html', posts=posts, user=user, searching=True, saved_post_id=saved_post_id)
+
+    versions = [*feed_version(user.id), user.image_file, sorted(saved_post_id)]
+    return conditional_page(versions, render)
+
+@users.route("/user/<string:username>/recipes.jsonl")
+def export_user_posts(username):
     user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(author=user, display=True).order_by(Post.date_posted.desc()).paginate(per_page=5, page=page)
-    return render_template('user_posts.html', posts=posts, user=user, searching=True, saved_post_id=saved_post_id)
+    criteria = [Post.user_id == user.id, Post.display == True]
+    if current_user != user:
+        criteria.append(Post.private == False)
+    records = stream_with_context(iter_jsonl(iter_posts(*criteria)))
+    return Response(records, mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={user.username}-recipes.jsonl'})
 
 @users.route("/reset_password", methods=['GET', 'POST'])
 def reset_request():
@@ -97,7 +130,7 @@ def reset_token(token):
     
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = hash_password(form.password.data)
         user.password = hashed_password
         db.session.commit()
         flash('Password successfully changed', 'success')
@@ -1,25 +1,6 @@
-import os
-import secrets
-from PIL import Image
 from flask import url_for
 from flask_mail import Message
-from recipe_share import mail
-from flask import current_app 
-import requests
-from flask_login import current_user
-
-def save_picture(form_picture):
-    if current_user.image_file != 'default.jpg':
-        os.remove(os.path.join(current_app.root_path, 'static/profile_pics', current_user.image_file))
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_filename = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static/profile_pics', picture_filename)
-    output_size = (125, 125)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
-    return picture_filename
+from recipe_share.users.outbox import queue_message
 
 def send_reset_email(user):
     token = user.get_reset_token()
@@ -29,4 +10,4 @@ def send_reset_email(user):
     msg.body = f'''To reset your password, visit the following link:
 {url_for('users.reset_token', token=token, _external=True)}
 '''
-    mail.send(msg)
\ No newline at end of file
+    queue_message(msg)
\ No newline at end of file
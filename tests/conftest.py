@@ -0,0 +1,93 @@
+import contextlib
+import pytest
+from sqlalchemy import event
+from recipe_share import create_app, db
+from recipe_share.config import Config
+from recipe_share.models import User, Post, SavePost, add_save_counts
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'test'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    BCRYPT_LOG_ROUNDS = 4
+    BCRYPT_WORKERS = 0
+    MAIL_OUTBOX_WORKER = 'none'
+    WARM_UP_ON_START = False
+
+
+def reset_process_caches():
+    # The caches below live at module level and would otherwise carry state
+    # from one test's database into the next.
+    from recipe_share import feeds
+    from recipe_share.fragments import fragment_cache
+    from recipe_share.posts.ingredient_index import ingredient_index
+    from recipe_share.posts.title_index import title_index
+    from recipe_share.posts.title_lookup import lookups
+    from recipe_share.users import cache
+    feeds._counts.clear()
+    feeds._most_saved = (0.0, [])
+    fragment_cache.clear()
+    ingredient_index.clear()
+    title_index.clear()
+    lookups.clear()
+    cache.users.clear()
+    cache.saved_ids.clear()
+
+
+@pytest.fixture
+def app():
+    # Requests get their own app context (and so their own `g` and session),
+    # so the fixture does not keep one pushed; tests push one to use `db`.
+    # bind_key=None: an app with a replica leaves that bind's (empty)
+    # metadata registered on `db` for the rest of the process.
+    reset_process_caches()
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.drop_all(bind_key=None)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def seed(authors, posts, saved_by=None):
+    # `posts` public posts spread over `authors` users; `saved_by` (a user
+    # id) saves every one of them. Needs an app context.
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'}
+        for i in range(1, authors + 1)])
+    if posts:
+        db.session.execute(db.insert(Post), [
+            {'id': i, 'title': f'Recipe {i}', 'content': 'Cook it.', 'ingredients': '1 egg',
+             'private': False, 'user_id': i % authors + 1}
+            for i in range(1, posts + 1)])
+    if saved_by is not None and posts:
+        db.session.execute(db.insert(SavePost), [{'user_id': saved_by, 'post_id': i} for i in range(1, posts + 1)])
+        add_save_counts({i: 1 for i in range(1, posts + 1)})
+    db.session.commit()
+
+
+@contextlib.contextmanager
+def count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,43 @@
+import pytest
+from recipe_share import create_app, db
+from tests.conftest import TestingConfig, login, reset_process_caches, seed
+
+
+@pytest.fixture
+def replicated_app(tmp_path):
+    # The "replica" is a separate database that never receives the primary's
+    # writes, which makes every read from it visible in the tests.
+    reset_process_caches()
+    config = type('ReplicaConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/primary.db',
+        'DATABASE_REPLICA_URI': f'sqlite:///{tmp_path}/replica.db',
+    })
+    app = create_app(config)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.metadata.create_all(db.engines['replica'])
+        seed(authors=1, posts=0)
+        with db.engines['replica'].begin() as connection:
+            connection.execute(db.insert(db.metadata.tables['user']),
+                               [{'id': 1, 'username': 'user1', 'email': 'user1@example.com', 'password': 'x'}])
+    return app
+
+
+def test_author_reads_own_write_from_primary(replicated_app):
+    author = replicated_app.test_client()
+    login(author, 1)
+    response = author.post('/post/new', data={'title': 'Fresh soup', 'content': 'Stir.',
+                                              'ingredients': 'water', 'submit_type': 'public'})
+    assert response.status_code == 302
+    assert b'Fresh soup' in author.get('/home').data
+
+    # Everyone else reads the (lagging) replica.
+    assert b'Fresh soup' not in replicated_app.test_client().get('/home').data
+
+
+def test_replica_reads_do_not_fill_the_saved_ids_cache(replicated_app):
+    from recipe_share.users import cache
+    reader = replicated_app.test_client()
+    login(reader, 1)
+    assert reader.get('/home').status_code == 200
+    assert cache.saved_ids.get(1) is None
@@ -0,0 +1,30 @@
+import pytest
+from recipe_share import db
+from tests.conftest import count_queries, login, reset_process_caches, seed
+
+# Every feed page must cost the same number of statements however many
+# posts and authors it shows.
+
+SIZES = [(1, 3, 2), (4, 12, 5), (25, 60, 20)]
+
+
+def queries_per_page(app, client, path, authors, posts, per_page):
+    reset_process_caches()
+    with app.app_context():
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        seed(authors, posts, saved_by=1)
+        engine = db.engine
+    app.config['FEED_PAGE_SIZE'] = per_page
+    login(client, 1)
+    with count_queries(engine) as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    assert 0 < response.data.count(b'<article class="media content-section">') <= per_page
+    return len(statements)
+
+
+@pytest.mark.parametrize('path', ['/home', '/personal_home', '/user/user1', '/saved_posts'])
+def test_feed_query_count_is_constant(app, client, path):
+    counts = [queries_per_page(app, client, path, *size) for size in SIZES]
+    assert len(set(counts)) == 1, counts
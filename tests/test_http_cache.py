@@ -0,0 +1,49 @@
+from tests.conftest import login, seed
+
+
+def test_home_etag_changes_when_an_author_is_renamed(app, client):
+    with app.app_context():
+        seed(authors=1, posts=2)
+    first = client.get('/home')
+    assert b'user1' in first.data
+    assert client.get('/home', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    author = app.test_client()
+    login(author, 1)
+    response = author.post('/account', data={'username': 'renamed', 'email': 'user1@example.com'})
+    assert response.headers['Location'] == '/account'
+
+    again = client.get('/home', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert b'renamed' in again.data
+
+
+def test_etags_change_when_an_authors_post_is_deleted(app, client):
+    with app.app_context():
+        seed(authors=2, posts=4)
+    # seed() gives odd posts to user2 and even posts to user1.
+    pages = ['/home', '/user/user1', '/user/user2']
+    etags = {page: client.get(page).headers['ETag'] for page in pages}
+
+    author = app.test_client()
+    login(author, 2)
+    author.post('/post/1/delete')
+
+    changed = {page for page in pages
+               if client.get(page, headers={'If-None-Match': etags[page]}).status_code == 200}
+    assert changed == {'/home', '/user/user2'}
+
+
+def test_feed_version_reads_indexes_only(app):
+    from recipe_share import db
+    from recipe_share.feeds import feed_version
+    from tests.conftest import count_queries
+    with app.app_context():
+        seed(authors=2, posts=10)
+        for user_id in (None, 1):
+            with count_queries(db.engine) as statements:
+                feed_version(user_id)
+            cursor = db.session.connection().connection.driver_connection.cursor()
+            plan = cursor.execute('EXPLAIN QUERY PLAN ' + statements[0],
+                                  (user_id,) * statements[0].count('?')).fetchall()
+            assert all('SCAN' not in detail or 'CONSTANT ROW' in detail for *_, detail in plan), plan
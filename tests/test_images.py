@@ -0,0 +1,26 @@
+import struct
+import zlib
+from io import BytesIO
+from recipe_share.users.images import check_picture
+
+
+def chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def png_header(width, height):
+    # A few bytes that claim any size: Image.open reads no pixel data.
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', b'') + chunk(b'IEND', b'')
+
+
+def test_oversized_header_is_refused_as_too_large(app):
+    upload = BytesIO(png_header(20000, 20000))
+    with app.app_context():
+        assert 'too large' in check_picture(upload)
+    assert upload.tell() == 0
+
+
+def test_unreadable_file_is_refused(app):
+    with app.app_context():
+        assert 'not an image' in check_picture(BytesIO(b'not a picture'))
@@ -0,0 +1,127 @@
+import json
+import random
+from datetime import datetime
+import pytest
+from recipe_share import db
+from recipe_share.models import ScrapedRecipe, Post
+from recipe_share.posts.corpus import score_recipe, search_corpus, search_post_ingredients, search_terms_key
+from benchmarks.seed import make_recipe
+from tests.conftest import seed
+
+# Scores and order come from the index alone, so they must be exactly what
+# the old full scan with score_recipe gave.
+
+QUERIES = [['tomato'], ['tomatoes'], ['potato'], ['chick'], ['egg'], ['onion', 'garlic'], ['chopped tom'],
+           ['400g'], ['½ tsp'], ['fraîche'], ['ea'], ['red wine vinegar'], ['pepper', 'bay leaf'],
+           ['cream', 'x'], ['saffron'], ['g can'], ['1 x 400g can chopped']]
+
+
+def add_recipes(rows, revision):
+    db.session.execute(db.insert(ScrapedRecipe), [
+        {'url': f'/recipes/{title}', 'title': title, 'ingredients': json.dumps(ingredients),
+         'method': json.dumps(['Cook it.']), 'fetched_at': datetime(2024, 1, 1), 'revision': revision}
+        for title, ingredients in rows])
+    db.session.commit()
+
+
+@pytest.fixture
+def corpus(app):
+    rng = random.Random(4)
+    recipes = {}
+    for i in range(300):
+        title, ingredients, _ = make_recipe(rng)
+        recipes[f'{title} {i}'] = ingredients
+    recipes['Chips'] = ['400g can chopped tomatoes', '2 potatoes, diced', '1 chicken breast']
+    # More lines than a line mask has bits.
+    recipes['Feast'] = [f'{i} tomatoes' for i in range(70)] + ['1 saffron bun']
+    app.config['INGREDIENT_SEARCH_LIMIT'] = 10000
+    with app.app_context():
+        add_recipes(recipes.items(), revision=1)
+        yield recipes
+
+
+@pytest.mark.parametrize('terms', QUERIES)
+def test_search_matches_full_scan(corpus, terms):
+    key = search_terms_key(terms)
+    expected = {title: score_recipe(ingredients, key) for title, ingredients in corpus.items()}
+    expected = {title: score for title, score in expected.items() if score}
+    assert {title: score for title, _, _, score in search_corpus(terms)} == expected
+
+
+def full_scan_order(recipes, terms):
+    key = search_terms_key(terms)
+    method_words = set('cook it.'.split())
+    ranked = [(score_recipe(ingredients, key), len(set(key) & method_words), title)
+              for title, ingredients in recipes.items()]
+    return [title for score, _, title in sorted(ranked, reverse=True) if score]
+
+
+@pytest.mark.parametrize('terms', [['tomato'], ['onion', 'garlic'], ['cook', 'egg'], ['it.', 'salt']])
+def test_search_keeps_full_scan_order_within_the_limit(app, corpus, terms):
+    app.config['INGREDIENT_SEARCH_LIMIT'] = 7
+    assert [title for title, *_ in search_corpus(terms)] == full_scan_order(corpus, terms)[:7]
+
+
+def test_substring_terms_match(corpus):
+    found = {title: score for title, _, _, score in search_corpus(['tomato', 'potato', 'chick'])}
+    assert found['Chips'] == 6
+
+
+def test_later_batch_with_same_fetched_at_is_found(corpus):
+    assert [title for title, *_ in search_corpus(['quail'])] == []
+    add_recipes([('Quail', ['2 quail eggs'])], revision=2)
+    assert [title for title, *_ in search_corpus(['quail'])] == ['Quail']
+
+
+@pytest.fixture
+def posts(app):
+    rng = random.Random(5)
+    app.config['INGREDIENT_SEARCH_LIMIT'] = 10000
+    app.config['INGREDIENT_INDEX_REFRESH'] = 0
+    with app.app_context():
+        seed(authors=3, posts=0)
+        rows = []
+        for i in range(1, 61):
+            title, ingredients, method = make_recipe(rng)
+            rows.append({'id': i, 'title': f'{title} {i}', 'ingredients': '\r\n'.join(ingredients),
+                         'content': ' '.join(method), 'private': i % 5 == 0, 'display': i % 7 != 0,
+                         'user_id': i % 3 + 1})
+        db.session.execute(db.insert(Post), rows)
+        db.session.commit()
+        yield rows
+
+
+def visible_scan(rows, terms, user_id):
+    key = search_terms_key(terms)
+    ranked = [(score_recipe(row['ingredients'].split('\n'), key),
+               len(set(key) & set(row['content'].lower().split())), row['title'])
+              for row in rows
+              if row['display'] and (not row['private'] or row['user_id'] == user_id)]
+    return [title for score, _, title in sorted(ranked, reverse=True) if score]
+
+
+@pytest.mark.parametrize('terms', [['tomato'], ['onion', 'garlic'], ['400g'], ['olive oil', 'chick']])
+@pytest.mark.parametrize('user_id', [None, 1, 2])
+def test_post_search_matches_full_scan(posts, terms, user_id):
+    found = [post.title for post in search_post_ingredients(terms, user_id)]
+    assert found == visible_scan(posts, terms, user_id)
+
+
+def test_post_search_sees_other_processes_writes(posts):
+    assert search_post_ingredients(['quail'], None) == []
+    # Written as another worker would: straight to the database.
+    db.session.add(Post(title='Quail', content='Roast.', ingredients='2 quail', private=False, user_id=1))
+    db.session.delete(db.session.get(Post, 1))
+    db.session.commit()
+    assert [post.title for post in search_post_ingredients(['quail'], None)] == ['Quail']
+    assert 1 not in {post.id for post in search_post_ingredients([posts[0]['ingredients'].split('\r\n')[0]], None)}
+
+
+def test_search_page_shows_posts_and_recipes(app, client, corpus):
+    with app.app_context():
+        seed(authors=1, posts=0)
+        db.session.add(Post(title='Gran’s chips', content='Fry.', ingredients='4 potatoes', private=False, user_id=1))
+        db.session.commit()
+    page = client.post('/search_ingredients', data={'ingredients': 'potato'}).get_data(as_text=True)
+    assert 'Gran’s chips' in page
+    assert 'Chips' in page
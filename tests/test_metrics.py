@@ -0,0 +1,31 @@
+import pytest
+from recipe_share import create_app
+from tests.conftest import TestingConfig
+
+
+def config_with(**values):
+    return type('MetricsConfig', (TestingConfig,), values)
+
+
+def test_production_refuses_to_start_without_token():
+    with pytest.raises(RuntimeError):
+        create_app(config_with(METRICS_REQUIRE_TOKEN=True, METRICS_TOKEN=None))
+
+
+@pytest.mark.parametrize('path', ['/metrics', '/stats/fragment-cache'])
+def test_stats_endpoints_need_the_token(path):
+    client = create_app(config_with(METRICS_TOKEN='secret')).test_client()
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get(path, headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_failed_statement_leaves_nothing_on_the_connection(app):
+    from sqlalchemy.exc import OperationalError
+    from recipe_share import db
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM no_such_table')
+            conn.exec_driver_sql('SELECT 1')
+            assert 'query_start' not in conn.info
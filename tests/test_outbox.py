@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from recipe_share import create_app, db
+from recipe_share.models import MailOutbox
+from recipe_share.users import outbox
+from tests.conftest import TestingConfig
+
+
+def test_thread_mode_starts_sender_on_first_request(monkeypatch):
+    started = []
+    monkeypatch.setattr(outbox, '_thread', None)
+    monkeypatch.setattr(outbox, '_ensure_thread', started.append)
+    config = type('ThreadConfig', (TestingConfig,), {'MAIL_OUTBOX_WORKER': 'thread'})
+    app = create_app(config)
+    assert not started
+    app.test_client().get('/about')
+    assert started == [app]
+
+
+def test_purge_keeps_pending_and_recent_mail(app):
+    now = datetime.utcnow()
+    old = now - timedelta(seconds=app.config['MAIL_OUTBOX_RETENTION'] + 60)
+    rows = {
+        'old sent': dict(created_at=old, sent_at=old),
+        'old failed': dict(created_at=old, failed=True),
+        'old pending': dict(created_at=old),
+        'recent sent': dict(created_at=now, sent_at=now),
+    }
+    with app.app_context():
+        for name, values in rows.items():
+            db.session.add(MailOutbox(sender='a@example.com', recipients='[]', message=name.encode(), **values))
+        db.session.commit()
+        assert outbox.purge_delivered(now) == 2
+        left = {row.message.decode() for row in db.session.scalars(db.select(MailOutbox))}
+    assert left == {'old pending', 'recent sent'}
@@ -0,0 +1,23 @@
+import os
+import pytest
+from recipe_share import create_app
+from tests.conftest import TestingConfig
+
+
+def config_with_cache_dir(directory):
+    return type('CacheDirConfig', (TestingConfig,), {'TEMPLATE_CACHE_DIR': directory})
+
+
+def test_template_cache_defaults_to_private_dir():
+    app = create_app(config_with_cache_dir(None))
+    directory = app.jinja_env.bytecode_cache.directory
+    assert os.stat(directory).st_mode & 0o077 == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='POSIX permissions')
+def test_writable_template_cache_dir_is_refused(tmp_path):
+    shared = tmp_path / 'templates'
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(RuntimeError):
+        create_app(config_with_cache_dir(str(shared)))
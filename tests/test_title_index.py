@@ -0,0 +1,40 @@
+import pytest
+from recipe_share import db
+from recipe_share.models import Post
+from recipe_share.posts.title_index import title_index
+from tests.conftest import count_queries, seed
+
+
+@pytest.fixture
+def refresh_every_call(app):
+    # As if each prediction came after TITLE_INDEX_REFRESH seconds.
+    app.config['TITLE_INDEX_REFRESH'] = 0
+    return app
+
+
+def test_changes_from_other_processes_are_applied_incrementally(refresh_every_call):
+    with refresh_every_call.app_context():
+        seed(authors=2, posts=6)
+        assert title_index.predictions('recipe', limit=10) == [f'Recipe {i}' for i in range(1, 7)]
+        # Written as another worker would: straight to the database.
+        db.session.delete(db.session.get(Post, 3))
+        db.session.get(Post, 4).private = True
+        db.session.add(Post(title='Recipe 7', content='', ingredients='', private=False, user_id=1))
+        db.session.commit()
+        with count_queries(db.engine) as statements:
+            public = title_index.predictions('recipe', limit=10)
+        assert public == ['Recipe 1', 'Recipe 2', 'Recipe 5', 'Recipe 6', 'Recipe 7']
+        # The state check, the deletes and the changed rows; no reload.
+        assert len(statements) == 3
+        owner = db.session.get(Post, 4).user_id
+        assert 'Recipe 4' in title_index.predictions('recipe', user_id=owner, limit=10)
+
+
+def test_predictions_between_refreshes_do_not_query(app):
+    with app.app_context():
+        seed(authors=2, posts=6)
+        title_index.predictions('rec')
+        with count_queries(db.engine) as statements:
+            for query in ('r', 're', 'rec', 'recipe 1', 'cipe'):
+                title_index.predictions(query, user_id=1)
+        assert statements == []
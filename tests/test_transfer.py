@@ -0,0 +1,17 @@
+from recipe_share import db
+from recipe_share.models import Post, SavePost
+from recipe_share.posts.transfer import iter_posts, iter_saves, import_jsonl, iter_jsonl
+from tests.conftest import seed
+
+
+def test_import_remaps_saves_to_new_post_ids(app):
+    with app.app_context():
+        seed(authors=3, posts=7, saved_by=2)
+        exported = list(iter_jsonl(list(iter_posts()) + list(iter_saves())))
+        # Import alongside the originals, so every post gets a new id.
+        stats = import_jsonl(exported, batch_size=3)
+        assert stats == {'posts': 7, 'saves': 7, 'skipped': 0}
+        saved = db.session.scalars(db.select(SavePost.post_id).where(SavePost.post_id > 7)).all()
+        assert sorted(saved) == list(range(8, 15))
+        assert db.session.scalar(db.select(Post.save_count).where(Post.id == 8)) == 1
+        assert db.session.scalar(db.select(db.func.count()).where(Post.import_id.is_not(None))) == 0